@@ -4,18 +4,28 @@
 API 路由定义
 """
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, File, Form, HTTPException, Query, Response, UploadFile
+from pydantic import BaseModel, ValidationError, field_validator
 from typing import Optional, List, Dict
 import json
+import os
 from pathlib import Path
 import re
 
-from ssh_manager import SSHManager
+from ssh_manager import (
+    SSHManager, PhaseTimer, SLOW_OPERATION_MS, CONNECTION_PROFILES, DEFAULT_PROFILE,
+    THROUGHPUT_WORKLOADS
+)
+import image_prepull
+import config_io
+import terminal_sessions
+from artifact_cache import ArtifactCache, DEFAULT_FORWARD_PORT, extract_artifacts
+from connection_prewarm import ConnectionPrewarmer
 
 # 创建路由
 ssh_router = APIRouter()
 docker_router = APIRouter()
+artifact_router = APIRouter()
 
 # SSH 管理器
 ssh_manager = SSHManager()
@@ -25,6 +35,10 @@ DATA_DIR = Path("data")
 SSH_CONFIGS_FILE = DATA_DIR / "ssh_configs.json"
 DOCKER_APPS_FILE = DATA_DIR / "docker_apps.json"
 
+# 制品缓存
+artifact_cache = ArtifactCache(DATA_DIR / "artifacts")
+ssh_manager.close_listeners.append(artifact_cache.forget)
+
 
 # ===== 数据模型 =====
 
@@ -38,6 +52,26 @@ class SSHConfig(BaseModel):
     auth_type: str = "password"  # password 或 private_key
     password: Optional[str] = None
     private_key: Optional[str] = None
+    tags: List[str] = []
+    profile: Optional[str] = None  # 连接配置档，为空时使用全局默认值
+    prewarm: bool = False  # 启动时预先建立连接并保持
+    
+    @field_validator('profile')
+    @classmethod
+    def check_profile(cls, value: Optional[str]) -> Optional[str]:
+        """拒绝未知的连接配置档，避免保存后每次连接都失败"""
+        if value and value not in CONNECTION_PROFILES:
+            raise ValueError(f"未知的连接配置档 {value}，可选: {', '.join(CONNECTION_PROFILES)}")
+        return value or None
+
+
+class SSHImportRequest(BaseModel):
+    """SSH 配置批量导入请求"""
+    format: str = "json"  # openssh / csv / json
+    content: str
+    tags: List[str] = []  # 附加到所有导入配置的标签
+    skip_duplicates: bool = True  # 跳过 host/port/username 相同的配置
+    default_username: Optional[str] = None  # 未指定用户名（如 OpenSSH 中无 User）时使用
 
 
 class SSHConnectRequest(BaseModel):
@@ -48,6 +82,14 @@ class SSHConnectRequest(BaseModel):
     username: Optional[str] = None
     password: Optional[str] = None
     private_key: Optional[str] = None
+    profile: Optional[str] = None  # 覆盖配置中的连接配置档
+
+
+class ProfileProbeRequest(SSHConnectRequest):
+    """连接配置档吞吐测试请求"""
+    profiles: List[str] = []  # 为空时测试全部配置档
+    size_mb: int = 8
+    workloads: List[str] = ["random", "text"]  # random 不可压缩数据，text 日志风格文本
 
 
 class CommandRequest(BaseModel):
@@ -56,6 +98,14 @@ class CommandRequest(BaseModel):
     command: str
 
 
+class BatchCommandRequest(BaseModel):
+    """批量命令执行请求"""
+    connection_id: str
+    commands: List[str]
+    stop_on_error: bool = True  # 某条命令失败后不再执行后续命令
+    stream: bool = False  # 以 NDJSON 逐条返回结果
+
+
 class DockerApp(BaseModel):
     """Docker 应用"""
     id: Optional[str] = None
@@ -65,6 +115,28 @@ class DockerApp(BaseModel):
     command: str
     variables: List[Dict[str, str]] = []
     category: str = "general"
+    images: List[str] = []  # 安装所需镜像（用于预拉取）
+    artifacts: List[str] = []  # 安装脚本下载的文件地址（经制品缓存提供）
+
+
+class PrepullRequest(BaseModel):
+    """镜像预拉取请求"""
+    connection_id: str
+    images: List[str]
+    concurrency: int = 3
+    mirror: Optional[str] = None
+
+
+class ArtifactFetchRequest(BaseModel):
+    """制品下载请求"""
+    url: str
+    name: Optional[str] = None  # 远程获取时使用的文件名，默认取 URL 中的文件名
+    refresh: bool = False  # 忽略已缓存的内容重新下载
+
+
+class ArtifactPrefetchRequest(BaseModel):
+    """制品批量预下载请求"""
+    urls: List[str]
 
 
 # ===== 工具函数 =====
@@ -78,9 +150,51 @@ def load_json_file(filepath: Path) -> list:
 
 
 def save_json_file(filepath: Path, data: list):
-    """保存 JSON 文件"""
-    with open(filepath, "w", encoding="utf-8") as f:
+    """保存 JSON 文件（先写临时文件再替换，避免写入中断导致文件损坏）"""
+    tmp_path = filepath.with_name(filepath.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, filepath)
+
+
+# SSH 配置缓存（按文件修改时间失效），同时缓存去除密钥后的列表
+_ssh_configs_cache = {"key": None, "configs": [], "public": []}
+
+
+def _file_key(filepath: Path):
+    try:
+        stat = filepath.stat()
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
+
+
+def _cache_ssh_configs(configs: list):
+    _ssh_configs_cache.update({
+        "key": _file_key(SSH_CONFIGS_FILE),
+        "configs": configs,
+        "public": [config_io.strip_secrets(c) for c in configs],
+    })
+
+
+def load_ssh_configs() -> list:
+    """加载 SSH 配置（返回列表副本，配置项本身请勿原地修改）"""
+    if _ssh_configs_cache["key"] is None or _ssh_configs_cache["key"] != _file_key(SSH_CONFIGS_FILE):
+        _cache_ssh_configs(load_json_file(SSH_CONFIGS_FILE))
+    return list(_ssh_configs_cache["configs"])
+
+
+def load_public_ssh_configs() -> list:
+    """加载不含密码和私钥的 SSH 配置"""
+    load_ssh_configs()
+    return _ssh_configs_cache["public"]
+
+
+def save_ssh_configs(configs: list):
+    """保存 SSH 配置并更新缓存"""
+    DATA_DIR.mkdir(exist_ok=True)
+    save_json_file(SSH_CONFIGS_FILE, configs)
+    _cache_ssh_configs(configs)
 
 
 def generate_id(prefix: str = "") -> str:
@@ -108,30 +222,148 @@ def replace_variables(command: str, values: dict) -> str:
 @ssh_router.post("/configs")
 async def create_ssh_config(config: SSHConfig):
     """创建 SSH 配置"""
-    configs = load_json_file(SSH_CONFIGS_FILE)
+    configs = load_ssh_configs()
     
     config.id = generate_id("ssh_")
     configs.append(config.dict())
     
-    save_json_file(SSH_CONFIGS_FILE, configs)
+    save_ssh_configs(configs)
     return {"message": "配置已保存", "config": config}
 
 
 @ssh_router.get("/configs")
-async def list_ssh_configs():
-    """列出所有 SSH 配置"""
-    configs = load_json_file(SSH_CONFIGS_FILE)
-    # 不返回密码和私钥
-    for config in configs:
-        config.pop('password', None)
-        config.pop('private_key', None)
-    return {"configs": configs}
+async def list_ssh_configs(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    name: Optional[str] = None,
+    host: Optional[str] = None,
+    tag: Optional[str] = None
+):
+    """
+    列出 SSH 配置（不返回密码和私钥）
+    
+    name/host 为不区分大小写的子串匹配，tag 为精确匹配；
+    指定 limit 时分页返回，下一页以 next_cursor 作为 cursor 参数
+    """
+    configs = load_public_ssh_configs()
+    
+    if name or host or tag:
+        name = (name or "").lower()
+        host = (host or "").lower()
+        configs = [
+            c for c in configs
+            if name in c.get('name', '').lower()
+            and host in c.get('host', '').lower()
+            and (not tag or tag in (c.get('tags') or []))
+        ]
+    
+    start = 0
+    if cursor:
+        start = next((i + 1 for i, c in enumerate(configs) if c['id'] == cursor), None)
+        if start is None:
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+    
+    end = start + limit if limit else len(configs)
+    page = configs[start:end]
+    return {
+        "configs": page,
+        "total": len(configs),
+        "next_cursor": page[-1]['id'] if page and end < len(configs) else None
+    }
+
+
+# 导入时常见的缺失字段提示
+_MISSING_FIELD_HINTS = {
+    "username": "缺少用户名（OpenSSH 配置中没有 User，可通过 default_username 指定）",
+    "host": "缺少主机地址",
+    "name": "缺少名称",
+}
+
+
+def _validation_message(error: ValidationError) -> str:
+    """将 pydantic 校验错误转换为简短的中文提示"""
+    messages = []
+    for item in error.errors():
+        field = ".".join(str(part) for part in item["loc"])
+        if item["type"] == "missing":
+            messages.append(_MISSING_FIELD_HINTS.get(field, f"缺少字段 {field}"))
+        else:
+            messages.append(f"{field}: {item['msg']}")
+    return "；".join(messages)
+
+
+@ssh_router.post("/configs/import")
+async def import_ssh_configs(request: SSHImportRequest):
+    """批量导入 SSH 配置（OpenSSH 配置、CSV 或 JSON 数组），一次性写入"""
+    parser = config_io.PARSERS.get(request.format)
+    if not parser:
+        raise HTTPException(status_code=400, detail=f"不支持的格式: {request.format}")
+    
+    try:
+        entries = parser(request.content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"解析失败: {e}")
+    
+    configs = load_ssh_configs()
+    existing = {(c['host'], c['port'], c['username']) for c in configs}
+    
+    imported, skipped, errors = [], 0, []
+    for index, entry in enumerate(entries):
+        name = entry.get('name') or entry.get('host') if isinstance(entry, dict) else None
+        if isinstance(entry, dict) and not entry.get('username') and request.default_username:
+            entry = {**entry, "username": request.default_username}
+        try:
+            config = SSHConfig(**entry)
+        except ValidationError as e:
+            errors.append({"index": index, "name": name, "error": _validation_message(e)})
+            continue
+        except TypeError:
+            errors.append({"index": index, "name": name, "error": "配置格式错误"})
+            continue
+        
+        key = (config.host, config.port, config.username)
+        if request.skip_duplicates and key in existing:
+            skipped += 1
+            continue
+        existing.add(key)
+        
+        config.id = generate_id("ssh_")
+        config.tags = list(dict.fromkeys(config.tags + request.tags))
+        imported.append(config.dict())
+    
+    if imported:
+        save_ssh_configs(configs + imported)
+    
+    return {
+        "message": f"已导入 {len(imported)} 个配置",
+        "imported": len(imported),
+        "skipped": skipped,
+        "errors": errors
+    }
+
+
+@ssh_router.get("/configs/export")
+async def export_ssh_configs(format: str = "json", include_secrets: bool = False):
+    """流式导出 SSH 配置（默认不含密码和私钥，OpenSSH 格式始终不含）"""
+    from fastapi.responses import StreamingResponse
+    
+    if format not in config_io.EXPORTERS:
+        raise HTTPException(status_code=400, detail=f"不支持的格式: {format}")
+    
+    exporter, media_type = config_io.EXPORTERS[format]
+    configs = load_ssh_configs() if include_secrets else load_public_ssh_configs()
+    extension = {"openssh": "conf"}.get(format, format)
+    return StreamingResponse(
+        exporter(configs),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="ssh_configs.{extension}"'}
+    )
 
 
 @ssh_router.get("/configs/{config_id}")
 async def get_ssh_config(config_id: str):
     """获取指定 SSH 配置"""
-    configs = load_json_file(SSH_CONFIGS_FILE)
+    configs = load_ssh_configs()
     for config in configs:
         if config['id'] == config_id:
             return {"config": config}
@@ -141,13 +373,13 @@ async def get_ssh_config(config_id: str):
 @ssh_router.put("/configs/{config_id}")
 async def update_ssh_config(config_id: str, config: SSHConfig):
     """更新 SSH 配置"""
-    configs = load_json_file(SSH_CONFIGS_FILE)
+    configs = load_ssh_configs()
     
     for i, c in enumerate(configs):
         if c['id'] == config_id:
             config.id = config_id
             configs[i] = config.dict()
-            save_json_file(SSH_CONFIGS_FILE, configs)
+            save_ssh_configs(configs)
             return {"message": "配置已更新", "config": config}
     
     raise HTTPException(status_code=404, detail="配置不存在")
@@ -156,54 +388,162 @@ async def update_ssh_config(config_id: str, config: SSHConfig):
 @ssh_router.delete("/configs/{config_id}")
 async def delete_ssh_config(config_id: str):
     """删除 SSH 配置"""
-    configs = load_json_file(SSH_CONFIGS_FILE)
+    configs = load_ssh_configs()
     configs = [c for c in configs if c['id'] != config_id]
-    save_json_file(SSH_CONFIGS_FILE, configs)
+    save_ssh_configs(configs)
     return {"message": "配置已删除"}
 
 
-@ssh_router.post("/connect")
-async def connect_ssh(request: SSHConnectRequest):
-    """连接 SSH"""
+def config_connect_params(config: dict, profile: Optional[str] = None) -> dict:
+    """根据已保存的配置生成 create_connection 参数"""
+    return {
+        "host": config['host'],
+        "port": config['port'],
+        "username": config['username'],
+        "password": config.get('password'),
+        "private_key": config.get('private_key'),
+        "name": config.get('name', f"{config['username']}@{config['host']}"),
+        "profile": profile or config.get('profile'),
+    }
+
+
+def resolve_connect_params(request: SSHConnectRequest) -> dict:
+    """根据 config_id 或直接提供的参数生成 create_connection 参数"""
     # 如果提供了 config_id，从配置中加载
-    config_name = None
     if request.config_id:
-        configs = load_json_file(SSH_CONFIGS_FILE)
+        configs = load_ssh_configs()
         config = next((c for c in configs if c['id'] == request.config_id), None)
         if not config:
             raise HTTPException(status_code=404, detail="配置不存在")
         
-        host = config['host']
-        port = config['port']
-        username = config['username']
-        password = config.get('password')
-        private_key = config.get('private_key')
-        config_name = config.get('name', f"{username}@{host}")
-    else:
-        # 使用直接提供的参数
-        host = request.host
-        port = request.port
-        username = request.username
-        password = request.password
-        private_key = request.private_key
-    
-    # 创建连接
-    connection_id, error = ssh_manager.create_connection(
-        host=host,
-        port=port,
-        username=username,
-        password=password,
-        private_key=private_key,
-        name=config_name
-    )
+        return config_connect_params(config, request.profile)
+    
+    # 使用直接提供的参数
+    return {
+        "host": request.host,
+        "port": request.port,
+        "username": request.username,
+        "password": request.password,
+        "private_key": request.private_key,
+        "name": None,
+        "profile": request.profile,
+    }
+
+
+@ssh_router.post("/connect")
+async def connect_ssh(request: SSHConnectRequest, response: Response):
+    """连接 SSH"""
+    params = resolve_connect_params(request)
+    
+    # 已预热的配置复用共享的预热连接（已断开时立即重连）；
+    # 指定了与配置不同的配置档时建立独立连接
+    warm_id = None
+    if request.config_id:
+        warm_id, error = await prewarmer.acquire(request.config_id)
+        if warm_id and ssh_manager.connections[warm_id].get('profile') != (params["profile"] or DEFAULT_PROFILE):
+            warm_id = None
+        elif error and not warm_id:
+            raise HTTPException(status_code=400, detail=error)
+    if warm_id:
+        response.headers["Server-Timing"] = "warm;dur=0"
+        return {
+            "message": "连接成功",
+            "connection_id": warm_id,
+            "info": ssh_manager.get_connection_info(warm_id),
+            "timing": {"phases": {}, "total": 0},
+            "warm": True
+        }
+    
+    # 创建连接（分阶段计时）
+    timer = PhaseTimer()
+    connection_id, error = ssh_manager.create_connection(**params, timer=timer)
     
     if error:
-        raise HTTPException(status_code=400, detail=error)
+        raise HTTPException(status_code=400, detail=error,
+                            headers={"Server-Timing": timer.server_timing()})
     
+    response.headers["Server-Timing"] = timer.server_timing()
     return {
         "message": "连接成功",
         "connection_id": connection_id,
-        "info": ssh_manager.get_connection_info(connection_id)
+        "info": ssh_manager.get_connection_info(connection_id),
+        "timing": timer.as_dict()
+    }
+
+
+@ssh_router.get("/prewarm")
+async def get_prewarm_status():
+    """预热连接状态"""
+    return prewarmer.snapshot()
+
+
+@ssh_router.get("/profiles")
+async def list_connection_profiles():
+    """列出连接配置档"""
+    return {
+        "default": DEFAULT_PROFILE,
+        "profiles": [
+            {"name": name, **profile}
+            for name, profile in CONNECTION_PROFILES.items()
+        ]
+    }
+
+
+def _probe_profiles(params: dict, profiles: List[str], size: int, workloads: List[str]) -> list:
+    """依次用各配置档建立临时连接并测量握手耗时和吞吐"""
+    results = []
+    for profile in profiles:
+        timer = PhaseTimer()
+        connection_id, error = ssh_manager.create_connection(
+            **{**params, "profile": profile}, timer=timer
+        )
+        result = {"profile": profile, "timing": timer.as_dict()}
+        if error:
+            results.append({**result, "error": error})
+            continue
+        try:
+            result["algorithms"] = ssh_manager.get_connection_info(connection_id)['algorithms']
+            result["throughput"] = {
+                workload: ssh_manager.measure_throughput(connection_id, size, workload)
+                for workload in workloads
+            }
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            ssh_manager.close_connection(connection_id)
+        results.append(result)
+    return results
+
+
+@ssh_router.post("/profiles/probe")
+async def probe_connection_profiles(request: ProfileProbeRequest):
+    """测量各连接配置档对目标主机的吞吐，按数据类型分别推荐最快的配置档"""
+    from starlette.concurrency import run_in_threadpool
+    
+    profiles = request.profiles or list(CONNECTION_PROFILES)
+    unknown = [p for p in profiles if p not in CONNECTION_PROFILES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的连接配置档: {', '.join(unknown)}")
+    
+    workloads = list(dict.fromkeys(request.workloads)) or ["random"]
+    unknown = [w for w in workloads if w not in THROUGHPUT_WORKLOADS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的测试数据类型: {', '.join(unknown)}")
+    
+    params = resolve_connect_params(request)
+    size = max(1, min(request.size_mb, 256)) * 1024 * 1024
+    results = await run_in_threadpool(
+        _probe_profiles, params, profiles, size, workloads
+    )
+    
+    measured = [r for r in results if "throughput" in r]
+    recommended = {}
+    for workload in workloads:
+        best = max(measured, key=lambda r: r["throughput"][workload]["mbps"], default=None)
+        recommended[workload] = best["profile"] if best else None
+    return {
+        "results": results,
+        "recommended": recommended
     }
 
 
@@ -216,43 +556,94 @@ async def list_connections():
 
 @ssh_router.delete("/connections/{connection_id}")
 async def disconnect_ssh(connection_id: str):
-    """断开 SSH 连接"""
+    """断开 SSH 连接（预热连接由多个会话共享，不会被关闭）"""
+    if prewarmer.is_warm(connection_id):
+        return {"message": "预热连接为共享连接，已保留", "kept": True}
     ssh_manager.close_connection(connection_id)
     return {"message": "连接已断开"}
 
 
+@ssh_router.get("/terminal-sessions")
+async def list_terminal_sessions(connection_id: Optional[str] = None):
+    """列出共享终端会话（可通过 /ws/terminal/{connection_id}?session= 加入）"""
+    return {"sessions": terminal_sessions.list_sessions(connection_id)}
+
+
 @ssh_router.post("/execute")
-async def execute_command(request: CommandRequest):
+async def execute_command(request: CommandRequest, response: Response):
     """执行命令"""
+    timer = PhaseTimer()
     stdout, stderr, exit_code = ssh_manager.execute_command(
         request.connection_id,
-        request.command
+        request.command,
+        timer=timer
     )
     
+    response.headers["Server-Timing"] = timer.server_timing()
     return {
         "stdout": stdout,
         "stderr": stderr,
         "exit_code": exit_code,
-        "success": exit_code == 0
+        "success": exit_code == 0,
+        "timing": timer.as_dict()
     }
 
 
-@ssh_router.post("/setup-docker-mirror/{connection_id}")
-async def setup_docker_mirror(connection_id: str):
-    """一键配置 Docker 镜像加速器"""
+@ssh_router.post("/execute-batch")
+async def execute_batch(request: BatchCommandRequest):
+    """在同一个远程 shell 会话中依次执行多条命令"""
+    from fastapi.responses import StreamingResponse
+    from starlette.concurrency import run_in_threadpool
     
-    # 获取SSH连接的密码（用于sudo）
-    # 从配置中查找对应的密码
-    configs = load_json_file(SSH_CONFIGS_FILE)
-    password = None
+    if not ssh_manager.get_connection(request.connection_id):
+        raise HTTPException(status_code=404, detail="连接不存在")
     
-    # 通过connection查找对应的config
+    results = ssh_manager.execute_batch(
+        request.connection_id,
+        request.commands,
+        stop_on_error=request.stop_on_error
+    )
+    
+    if request.stream:
+        return StreamingResponse(
+            (json.dumps(result, ensure_ascii=False) + "\n" for result in results),
+            media_type="application/x-ndjson"
+        )
+    
+    # 批量命令耗时较长，放到线程池执行，避免阻塞其他请求
+    results = await run_in_threadpool(list, results)
+    return {
+        "results": results,
+        "success": all(r['status'] == "ok" for r in results),
+        "duration": round(sum(r['duration'] for r in results), 3)
+    }
+
+
+@ssh_router.get("/debug/slow-operations")
+async def list_slow_operations():
+    """最近的慢连接/慢命令（最新的在前）"""
+    return {
+        "threshold_ms": SLOW_OPERATION_MS,
+        "operations": list(reversed(ssh_manager.slow_operations))
+    }
+
+
+def find_sudo_password(connection_id: str) -> Optional[str]:
+    """通过连接对应的 SSH 配置查找密码（用于 sudo）"""
     conn_info = ssh_manager.get_connection_info(connection_id)
     if conn_info:
-        for config in configs:
+        for config in load_ssh_configs():
             if config['host'] == conn_info['host'] and config['username'] == conn_info['username']:
-                password = config.get('password')
-                break
+                return config.get('password')
+    return None
+
+
+@ssh_router.post("/setup-docker-mirror/{connection_id}")
+async def setup_docker_mirror(connection_id: str):
+    """一键配置 Docker 镜像加速器"""
+    
+    # 获取SSH连接的密码（用于sudo）
+    password = find_sudo_password(connection_id)
     
     if not password:
         return {
@@ -326,15 +717,7 @@ async def restore_docker_config(connection_id: str):
     """恢复 Docker 原配置"""
     
     # 获取密码
-    configs = load_json_file(SSH_CONFIGS_FILE)
-    password = None
-    
-    conn_info = ssh_manager.get_connection_info(connection_id)
-    if conn_info:
-        for config in configs:
-            if config['host'] == conn_info['host'] and config['username'] == conn_info['username']:
-                password = config.get('password')
-                break
+    password = find_sudo_password(connection_id)
     
     if not password:
         return {
@@ -445,6 +828,18 @@ async def list_docker_apps():
                         script_content = f.read()
             
             app['script_content'] = script_content
+            
+            # 应用库未声明镜像时，从脚本的 docker pull 语句中提取
+            if not app.get('images'):
+                app['images'] = image_prepull.extract_images(script_content)
+            
+            # 应用库未声明下载文件时，从脚本中提取
+            if not app.get('artifacts'):
+                app['artifacts'] = extract_artifacts(script_content)
+        
+        # 登记下载地址，远程请求未缓存的文件时由制品缓存按需下载
+        for url in app.get('artifacts', []):
+            artifact_cache.register_source(url)
     
     return {"apps": apps, "source": source}
 
@@ -494,6 +889,28 @@ async def install_docker_app(app_id: str, connection_id: str, variables: Dict[st
     }
 
 
+@docker_router.post("/prepull")
+async def prepull_images(request: PrepullRequest):
+    """预拉取镜像（跳过已有镜像，并发拉取，以 NDJSON 流式返回进度）"""
+    from fastapi.responses import StreamingResponse
+    
+    if not ssh_manager.get_connection(request.connection_id):
+        raise HTTPException(status_code=404, detail="连接不存在")
+    
+    events = image_prepull.prepull_events(
+        ssh_manager,
+        request.connection_id,
+        request.images,
+        concurrency=request.concurrency,
+        mirror=request.mirror,
+        sudo_password=find_sudo_password(request.connection_id)
+    )
+    return StreamingResponse(
+        (json.dumps(event, ensure_ascii=False) + "\n" for event in events),
+        media_type="application/x-ndjson"
+    )
+
+
 @docker_router.get("/scripts/{script_name}")
 async def get_docker_script(script_name: str):
     """获取 Docker 安装脚本（用于远程执行）"""
@@ -514,6 +931,105 @@ async def get_docker_script(script_name: str):
     return PlainTextResponse(content, media_type='text/plain')
 
 
+# ===== 制品缓存 API =====
+
+@artifact_router.get("")
+async def list_artifacts():
+    """列出已缓存的制品"""
+    return {"artifacts": artifact_cache.list()}
+
+
+@artifact_router.post("/fetch")
+async def fetch_artifact(request: ArtifactFetchRequest):
+    """下载制品到本地缓存（同一 URL 只下载一次）"""
+    import httpx
+    
+    try:
+        entry, downloaded = await artifact_cache.fetch(request.url, request.name, request.refresh)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"下载失败: {e}")
+    return {"artifact": entry, "downloaded": downloaded}
+
+
+@artifact_router.post("/prefetch")
+async def prefetch_artifacts(request: ArtifactPrefetchRequest):
+    """并发下载多个制品到本地缓存（已缓存的跳过），单个失败不影响其他"""
+    import asyncio
+    
+    async def fetch_one(url: str) -> dict:
+        try:
+            entry, downloaded = await artifact_cache.fetch(url)
+            return {"url": url, "name": entry["name"], "size": entry["size"], "downloaded": downloaded}
+        except Exception as e:
+            return {"url": url, "error": str(e)}
+    
+    results = await asyncio.gather(*(fetch_one(url) for url in dict.fromkeys(request.urls)))
+    return {
+        "results": results,
+        "success": all("error" not in r for r in results)
+    }
+
+
+@artifact_router.post("/upload")
+async def upload_artifact(file: UploadFile = File(...), name: Optional[str] = Form(None)):
+    """上传制品到本地缓存"""
+    async def chunks():
+        while True:
+            chunk = await file.read(1024 * 1024)
+            if not chunk:
+                break
+            yield chunk
+    
+    entry = await artifact_cache.add_stream(name or file.filename or "artifact", chunks())
+    return {"artifact": entry}
+
+
+@artifact_router.delete("/{sha256}")
+async def delete_artifact(sha256: str):
+    """删除缓存的制品"""
+    if not artifact_cache.delete(sha256):
+        raise HTTPException(status_code=404, detail="制品不存在")
+    return {"message": "制品已删除"}
+
+
+@artifact_router.post("/forward/{connection_id}")
+async def start_artifact_forward(connection_id: str, port: int = DEFAULT_FORWARD_PORT):
+    """
+    在远程主机上开启反向端口转发，远程可通过
+    http://127.0.0.1:<port>/<文件名或 sha256> 获取缓存的制品
+    """
+    from starlette.concurrency import run_in_threadpool
+    
+    try:
+        actual = await run_in_threadpool(
+            artifact_cache.start_forward, ssh_manager, connection_id, port
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"端口转发失败: {e}")
+    return {"port": actual, "url": f"http://127.0.0.1:{actual}"}
+
+
+@artifact_router.get("/forward/{connection_id}")
+async def get_artifact_forward(connection_id: str):
+    """查询远程主机上的转发端口"""
+    port = artifact_cache.forward_port(ssh_manager, connection_id)
+    return {"port": port, "url": f"http://127.0.0.1:{port}" if port else None}
+
+
+@artifact_router.delete("/forward/{connection_id}")
+async def stop_artifact_forward(connection_id: str):
+    """取消反向端口转发"""
+    if not artifact_cache.stop_forward(ssh_manager, connection_id):
+        raise HTTPException(status_code=404, detail="转发不存在")
+    return {"message": "转发已取消"}
+
+
+# 连接预热（在应用启动时由 main.py 启动）
+prewarmer = ConnectionPrewarmer(ssh_manager, load_ssh_configs, config_connect_params)
+
+
 def get_default_docker_apps() -> list:
     """获取默认 Docker 应用列表"""
     return [
@@ -524,6 +1040,7 @@ def get_default_docker_apps() -> list:
             "icon": "🌐",
             "category": "web",
             "command": "docker run -d --name nginx -p ${port}:80 -v ${html_path}:/usr/share/nginx/html nginx:latest",
+            "images": ["nginx:latest"],
             "variables": [
                 {"name": "port", "description": "映射端口", "default": "8080"},
                 {"name": "html_path", "description": "HTML 文件路径", "default": "/data/html"}
@@ -536,6 +1053,7 @@ def get_default_docker_apps() -> list:
             "icon": "🗄️",
             "category": "database",
             "command": "docker run -d --name mysql -p ${port}:3306 -e MYSQL_ROOT_PASSWORD=${password} -v ${data_path}:/var/lib/mysql mysql:latest",
+            "images": ["mysql:latest"],
             "variables": [
                 {"name": "port", "description": "映射端口", "default": "3306"},
                 {"name": "password", "description": "Root 密码", "default": ""},
@@ -549,6 +1067,7 @@ def get_default_docker_apps() -> list:
             "icon": "📦",
             "category": "database",
             "command": "docker run -d --name redis -p ${port}:6379 redis:latest",
+            "images": ["redis:latest"],
             "variables": [
                 {"name": "port", "description": "映射端口", "default": "6379"}
             ]
@@ -560,6 +1079,7 @@ def get_default_docker_apps() -> list:
             "icon": "🎛️",
             "category": "tools",
             "command": "docker run -d --name portainer -p ${port}:9000 -v /var/run/docker.sock:/var/run/docker.sock -v ${data_path}:/data portainer/portainer-ce:latest",
+            "images": ["portainer/portainer-ce:latest"],
             "variables": [
                 {"name": "port", "description": "映射端口", "default": "9000"},
                 {"name": "data_path", "description": "数据目录", "default": "/data/portainer"}
@@ -572,6 +1092,7 @@ def get_default_docker_apps() -> list:
             "icon": "☁️",
             "category": "storage",
             "command": "docker run -d --name nextcloud -p ${port}:80 -v ${data_path}:/var/www/html nextcloud:latest",
+            "images": ["nextcloud:latest"],
             "variables": [
                 {"name": "port", "description": "映射端口", "default": "8080"},
                 {"name": "data_path", "description": "数据目录", "default": "/data/nextcloud"}
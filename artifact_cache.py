@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+制品缓存
+按内容哈希保存下载或上传的文件，并通过 SSH 反向端口转发提供给远程主机，
+远程脚本可从 http://127.0.0.1:<端口>/<文件名> 获取，避免每台主机重复下载
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+from ssh_manager import SSHManager
+
+# 远程主机上转发端口的默认值（安装脚本默认从该端口获取缓存）
+DEFAULT_FORWARD_PORT = 17380
+
+# 请求头最大长度
+MAX_REQUEST_HEAD = 8192
+
+CHUNK_SIZE = 64 * 1024
+
+# 安装脚本中可缓存的下载地址（压缩包等，忽略包含变量的地址和本机地址）
+_ARTIFACT_URL_PATTERN = re.compile(
+    r"""https?://[^\s"'${}]+?\.(?:tgz|tar\.gz|tar\.xz|tar\.bz2|tar|zip|gz|xz)(?=["'\s]|$)""",
+    re.MULTILINE
+)
+
+
+def extract_artifacts(script: str) -> List[str]:
+    """从安装脚本中提取可缓存的下载地址"""
+    urls = []
+    for url in _ARTIFACT_URL_PATTERN.findall(script or ''):
+        if urlparse(url).hostname in ("127.0.0.1", "localhost"):
+            continue
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+def artifact_name(url: str) -> str:
+    """远程获取时使用的文件名（URL 路径中的文件名）"""
+    return posixpath.basename(unquote(urlparse(url).path)) or "artifact"
+
+
+class _PendingArtifact:
+    """写入中的制品：边写入临时文件边计算哈希"""
+
+    def __init__(self, root: Path):
+        root.mkdir(parents=True, exist_ok=True)
+        self.path = root / f".tmp-{uuid.uuid4().hex}"
+        self.file = open(self.path, "wb")
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.digest.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class ArtifactCache:
+    """制品缓存"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.index_file = root / "index.json"
+        self.entries: List[dict] = []
+        self.forwards: Dict[str, int] = {}  # connection_id -> 远程端口
+        self.sources: Dict[str, str] = {}  # 文件名 -> 下载地址（未缓存时按需下载）
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        self._loaded = False
+
+    # ===== 存储 =====
+
+    def _load(self):
+        if not self._loaded:
+            if self.index_file.exists():
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            self._loaded = True
+
+    def _save(self):
+        tmp_path = self.index_file.with_name("index.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_file)
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            self._load()
+            return list(self.entries)
+
+    def find(self, key: str) -> Optional[dict]:
+        """按哈希、文件名或来源 URL 查找（同名时返回最新的）"""
+        with self._lock:
+            self._load()
+            for entry in reversed(self.entries):
+                if key in (entry["sha256"], entry["name"], entry.get("url")):
+                    return entry
+        return None
+
+    def register_source(self, url: str, name: Optional[str] = None) -> str:
+        """登记下载地址，远程请求未缓存的文件时按需下载"""
+        name = name or artifact_name(url)
+        self.sources[name] = url
+        return name
+
+    def _commit(self, pending: _PendingArtifact, name: str, url: Optional[str] = None) -> dict:
+        """将临时文件移入内容地址并登记（内容相同则只保留一份）"""
+        pending.close()
+        sha256 = pending.digest.hexdigest()
+        size = pending.size
+        target = self.path_for(sha256)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            pending.path.unlink()
+        else:
+            os.replace(pending.path, target)
+
+        entry = {
+            "sha256": sha256,
+            "name": name,
+            "url": url,
+            "size": size,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._load()
+            self.entries = [
+                e for e in self.entries
+                if not (e["name"] == name and e["sha256"] == sha256)
+            ]
+            self.entries.append(entry)
+            self._save()
+        return entry
+
+    async def add_stream(self, name: str, chunks: AsyncIterator[bytes],
+                         url: Optional[str] = None) -> dict:
+        """边写入边计算哈希"""
+        pending = _PendingArtifact(self.root)
+        try:
+            async for chunk in chunks:
+                pending.write(chunk)
+        except BaseException:
+            pending.abort()
+            raise
+        return self._commit(pending, name, url)
+
+    async def fetch(self, url: str, name: Optional[str] = None, refresh: bool = False) -> tuple:
+        """
+        下载并缓存（同一 URL 只下载一次）
+
+        返回: (entry, downloaded)
+        """
+        import httpx
+
+        name = self.register_source(url, name)
+        if not refresh:
+            existing = self.find(url)
+            if existing and self.path_for(existing["sha256"]).exists():
+                return existing, False
+
+        async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                entry = await self.add_stream(name, response.aiter_bytes(CHUNK_SIZE), url=url)
+        return entry, True
+
+    def _fetch_through(self, key: str) -> Optional[dict]:
+        """
+        远程请求的文件未缓存但下载地址已登记时，先下载再提供（在转发线程中执行）
+
+        同名文件同时只下载一次，其他请求等待下载完成后直接使用缓存。
+        """
+        import httpx
+
+        url = self.sources.get(key)
+        if not url:
+            return None
+        with self._lock:
+            lock = self._fetch_locks.setdefault(key, threading.Lock())
+        with lock:
+            existing = self.find(url)
+            if existing and self.path_for(existing["sha256"]).exists():
+                return existing
+            pending = _PendingArtifact(self.root)
+            try:
+                with httpx.stream("GET", url, timeout=60.0, follow_redirects=True) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_bytes(CHUNK_SIZE):
+                        pending.write(chunk)
+            except BaseException:
+                pending.abort()
+                raise
+            return self._commit(pending, key, url)
+
+    def delete(self, sha256: str) -> bool:
+        with self._lock:
+            self._load()
+            remaining = [e for e in self.entries if e["sha256"] != sha256]
+            if len(remaining) == len(self.entries):
+                return False
+            self.entries = remaining
+            self._save()
+        self.path_for(sha256).unlink(missing_ok=True)
+        return True
+
+    # ===== 反向端口转发 =====
+
+    def start_forward(self, ssh_manager: SSHManager, connection_id: str,
+                      port: int = DEFAULT_FORWARD_PORT) -> int:
+        """
+        在远程主机的 127.0.0.1:port 上提供缓存（port 为 0 时由远程分配）
+
+        返回: 实际端口
+        """
+        client = ssh_manager.get_connection(connection_id)
+        if not client:
+            raise ValueError("连接不存在")
+        transport = client.get_transport()
+
+        self._prune(ssh_manager)
+        current = self.forwards.get(connection_id)
+        if current is not None and transport.is_active():
+            return current
+
+        def handler(channel, origin, server):
+            # 在 paramiko 传输线程中回调，需另起线程处理请求
+            threading.Thread(target=self._serve, args=(channel,), daemon=True).start()
+
+        actual = transport.request_port_forward("127.0.0.1", port, handler=handler)
+        self.forwards[connection_id] = actual
+        return actual
+
+    def stop_forward(self, ssh_manager: SSHManager, connection_id: str) -> bool:
+        port = self.forwards.pop(connection_id, None)
+        client = ssh_manager.get_connection(connection_id)
+        if port is None or not client:
+            return False
+        try:
+            client.get_transport().cancel_port_forward("127.0.0.1", port)
+        except Exception:
+            pass
+        return True
+
+    def forget(self, connection_id: str):
+        """连接关闭或被替换时清除转发记录"""
+        self.forwards.pop(connection_id, None)
+
+    def _prune(self, ssh_manager: SSHManager):
+        """清除已断开连接的转发记录"""
+        for connection_id in list(self.forwards):
+            client = ssh_manager.get_connection(connection_id)
+            transport = client.get_transport() if client else None
+            if not transport or not transport.is_active():
+                self.forget(connection_id)
+
+    def forward_port(self, ssh_manager: SSHManager, connection_id: str) -> Optional[int]:
+        """当前转发端口（连接已断开时清除记录）"""
+        client = ssh_manager.get_connection(connection_id)
+        if not client or not client.get_transport() or not client.get_transport().is_active():
+            self.forwards.pop(connection_id, None)
+            return None
+        return self.forwards.get(connection_id)
+
+    def _serve(self, channel):
+        """在转发通道上处理一个 HTTP 请求（GET/HEAD /<文件名|sha256>）"""
+        try:
+            channel.settimeout(30)
+            head = b""
+            while b"\r\n\r\n" not in head and len(head) < MAX_REQUEST_HEAD:
+                data = channel.recv(4096)
+                if not data:
+                    return
+                head += data
+
+            request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] not in ("GET", "HEAD"):
+                self._respond(channel, 405, b"method not allowed\n")
+                return
+
+            key = unquote(parts[1].split("?", 1)[0].lstrip("/"))
+            entry = self.find(key) if key else None
+            if key and (not entry or not self.path_for(entry["sha256"]).exists()):
+                entry = self._fetch_through(key)
+            path = self.path_for(entry["sha256"]) if entry else None
+            if not entry or not path.exists():
+                self._respond(channel, 404, b"not found\n")
+                return
+
+            channel.sendall((
+                "HTTP/1.0 200 OK\r\n"
+                "Content-Type: application/octet-stream\r\n"
+                f"Content-Length: {entry['size']}\r\n"
+                f"ETag: \"{entry['sha256']}\"\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode())
+            if parts[0] == "GET":
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        channel.sendall(chunk)
+        except Exception as e:
+            print(f"制品缓存请求错误: {e}")
+        finally:
+            channel.close()
+
+    @staticmethod
+    def _respond(channel, status: int, body: bytes):
+        reason = {404: "Not Found", 405: "Method Not Allowed"}.get(status, "Error")
+        channel.sendall(
+            f"HTTP/1.0 {status} {reason}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
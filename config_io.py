@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SSH 配置导入导出
+支持 OpenSSH 配置文件（~/.ssh/config）、CSV 和 JSON 数组
+"""
+
+import csv
+import fnmatch
+import io
+import json
+import shlex
+from typing import Iterator, List
+
+# CSV 列顺序（导入时按表头匹配，tags 以 ; 分隔）
+CSV_FIELDS = ["name", "host", "port", "username", "auth_type", "password", "private_key", "tags"]
+
+# 导出时去除的敏感字段
+SECRET_FIELDS = ("password", "private_key")
+
+# OpenSSH 关键字 -> 配置字段
+_OPENSSH_KEYS = {
+    "hostname": "host",
+    "port": "port",
+    "user": "username",
+    "identityfile": "identity_file",
+}
+
+
+def _split_tags(value) -> List[str]:
+    if isinstance(value, list):
+        return [str(t).strip() for t in value if str(t).strip()]
+    return [t.strip() for t in str(value or "").replace("|", ";").split(";") if t.strip()]
+
+
+def _host_matches(alias: str, patterns: List[str]) -> bool:
+    """按 OpenSSH 规则判断别名是否匹配 Host 模式列表（! 开头为排除）"""
+    alias = alias.lower()
+    matched = False
+    for pattern in patterns:
+        negated = pattern.startswith("!")
+        if fnmatch.fnmatchcase(alias, pattern.lstrip("!").lower()):
+            if negated:
+                return False
+            matched = True
+    return matched
+
+
+def parse_openssh(content: str) -> List[dict]:
+    """
+    解析 OpenSSH 配置
+
+    每个不含通配符的 Host 别名生成一条配置，按文件顺序应用所有匹配该别名的
+    Host 块（含通配符与 ! 排除），同一选项以首次出现的值为准；首个 Host 之前的
+    设置适用于所有主机。Match 块无法在此求值，直接忽略。
+    IdentityFile 指向本机文件，导入后需手动粘贴私钥。
+    """
+    blocks = []  # (patterns, options)，patterns 为 None 表示适用于所有主机
+    current = (None, [])
+    in_match = False
+
+    for raw in content.splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=" in line.split(None, 1)[0]:
+            key, _, value = line.partition("=")
+        else:
+            parts = line.split(None, 1)
+            key, value = parts[0], parts[1] if len(parts) > 1 else ""
+        key = key.strip().lower()
+        value = value.strip()
+
+        if key == "host":
+            blocks.append(current)
+            current = (shlex.split(value), [])
+            in_match = False
+            continue
+        if key == "match":
+            in_match = True
+            continue
+        if in_match or key not in _OPENSSH_KEYS:
+            continue
+        current[1].append((_OPENSSH_KEYS[key], value.strip('"')))
+    blocks.append(current)
+
+    aliases = []
+    for patterns, _ in blocks:
+        for alias in patterns or []:
+            if "*" in alias or "?" in alias or alias.startswith("!"):
+                continue
+            if alias not in aliases:
+                aliases.append(alias)
+
+    configs = []
+    for alias in aliases:
+        merged = {}
+        for patterns, options in blocks:
+            if patterns is not None and not _host_matches(alias, patterns):
+                continue
+            for field, value in options:
+                merged.setdefault(field, value)
+        config = {
+            "name": alias,
+            "host": merged.get("host", alias),
+            "port": merged.get("port", 22),
+            "auth_type": "private_key" if merged.get("identity_file") else "password",
+        }
+        if merged.get("username"):
+            config["username"] = merged["username"]
+        configs.append(config)
+    return configs
+
+
+def parse_csv(content: str) -> List[dict]:
+    """解析 CSV（需包含表头）"""
+    configs = []
+    for row in csv.DictReader(io.StringIO(content)):
+        config = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+        config = {k: v for k, v in config.items() if v != ""}
+        if "tags" in config:
+            config["tags"] = _split_tags(config["tags"])
+        config.setdefault("name", config.get("host"))
+        configs.append(config)
+    return configs
+
+
+def parse_json(content: str) -> List[dict]:
+    """解析 JSON 数组"""
+    data = json.loads(content)
+    if not isinstance(data, list):
+        raise ValueError("JSON 内容必须是数组")
+    return data
+
+
+PARSERS = {
+    "openssh": parse_openssh,
+    "csv": parse_csv,
+    "json": parse_json,
+}
+
+
+def strip_secrets(config: dict) -> dict:
+    """返回去除密码和私钥后的配置副本"""
+    return {k: v for k, v in config.items() if k not in SECRET_FIELDS}
+
+
+def export_json(configs: List[dict]) -> Iterator[str]:
+    """逐条输出 JSON 数组"""
+    yield "[\n"
+    for i, config in enumerate(configs):
+        prefix = ",\n" if i else ""
+        yield prefix + json.dumps(config, ensure_ascii=False)
+    yield "\n]\n"
+
+
+def export_csv(configs: List[dict]) -> Iterator[str]:
+    """逐行输出 CSV"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for config in configs:
+        row = dict(config)
+        row["tags"] = ";".join(config.get("tags") or [])
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_openssh(configs: List[dict]) -> Iterator[str]:
+    """逐条输出 OpenSSH Host 配置块（不含密码和私钥）"""
+    for config in configs:
+        alias = "".join(c if c.isalnum() or c in "-_." else "-" for c in config["name"])
+        yield (
+            f"# {config['name']}\n"
+            f"Host {alias}\n"
+            f"    HostName {config['host']}\n"
+            f"    Port {config.get('port', 22)}\n"
+            f"    User {config['username']}\n\n"
+        )
+
+
+EXPORTERS = {
+    "json": (export_json, "application/json"),
+    "csv": (export_csv, "text/csv"),
+    "openssh": (export_openssh, "text/plain"),
+}
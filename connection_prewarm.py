@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+连接预热
+启动时并发连接标记了 prewarm 的 SSH 配置，之后定期检查连接状态，
+断开的连接按指数退避重连，用户首次点击即可直接使用
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from ssh_manager import SSHManager
+
+# 同时建立的预热连接数
+PREWARM_CONCURRENCY = int(os.getenv("DOCKSSH_PREWARM_CONCURRENCY", "4"))
+
+# 健康检查间隔（秒）
+CHECK_INTERVAL = 10
+
+# 预热连接的 SSH keepalive 间隔（秒），用于及时发现对端失联
+KEEPALIVE_INTERVAL = 30
+
+# 重连退避（秒）
+BACKOFF_BASE = 2
+BACKOFF_MAX = 300
+
+# 决定连接本身的配置字段（仅修改名称等其他字段时保留原连接）
+CONNECT_FIELDS = ("host", "port", "username", "password", "private_key", "profile")
+
+
+class ConnectionPrewarmer:
+    """连接预热管理"""
+
+    def __init__(self, ssh_manager: SSHManager,
+                 load_configs: Callable[[], List[dict]],
+                 connect_params: Callable[[dict], dict]):
+        self.ssh_manager = ssh_manager
+        self.load_configs = load_configs
+        self.connect_params = connect_params
+        self.hosts: Dict[str, dict] = {}  # config_id -> 预热状态
+        self._params: Dict[str, dict] = {}  # config_id -> 建立连接时使用的参数
+        self._locks: Dict[str, asyncio.Lock] = {}  # config_id -> 连接锁，避免重复连接
+        self.ready = False
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._ready_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _flagged_configs(self) -> Dict[str, dict]:
+        return {c['id']: c for c in self.load_configs() if c.get('prewarm')}
+
+    def _connect_key(self, config: dict) -> dict:
+        params = self.connect_params(config)
+        return {field: params.get(field) for field in CONNECT_FIELDS}
+
+    def _sync(self) -> List[dict]:
+        """同步预热列表：加入新标记的配置，移除已删除或取消标记的配置"""
+        configs = self._flagged_configs()
+        for config_id in list(self.hosts):
+            config = configs.get(config_id)
+            params = self._params.get(config_id)
+            # 配置被删除、取消标记或连接参数被修改时，丢弃原预热连接
+            if config is None or (params is not None and params != self._connect_key(config)):
+                self.ssh_manager.close_connection(self.hosts.pop(config_id)["connection_id"])
+                self._params.pop(config_id, None)
+            else:
+                self.hosts[config_id].update({"name": config.get('name'), "host": config['host']})
+        for config_id, config in configs.items():
+            self.hosts.setdefault(config_id, {
+                "config_id": config_id,
+                "name": config.get('name'),
+                "host": config['host'],
+                "status": "pending",  # pending / connecting / ready / backoff
+                "connection_id": None,
+                "error": None,
+                "attempts": 0,
+                "retry_at": 0,
+                "connected_at": None,
+                "connect_ms": None,
+            })
+        return list(configs.values())
+
+    def _is_alive(self, connection_id: Optional[str]) -> bool:
+        client = self.ssh_manager.get_connection(connection_id) if connection_id else None
+        transport = client.get_transport() if client else None
+        return bool(transport and transport.is_active())
+
+    async def _connect(self, config: dict):
+        """建立一个预热连接，失败时安排退避重连"""
+        async with self._locks.setdefault(config['id'], asyncio.Lock()):
+            entry = self.hosts.get(config['id'])
+            if entry is None or self.connection_for(config['id']):
+                return  # 配置已移除，或已由其他任务连接
+            await self._open(config, entry)
+
+    async def _open(self, config: dict, entry: dict):
+        """建立连接并更新状态（调用方持有该配置的连接锁）"""
+        # 清理已断开的旧连接
+        if entry["connection_id"]:
+            self.ssh_manager.close_connection(entry["connection_id"])
+            entry["connection_id"] = None
+
+        params = self.connect_params(config)
+        async with self._semaphore:
+            entry["status"] = "connecting"
+            start = time.perf_counter()
+            connection_id, error = await asyncio.to_thread(
+                self.ssh_manager.create_connection, **params
+            )
+
+        if self.hosts.get(config['id']) is not entry:
+            # 连接期间配置已被移除
+            self.ssh_manager.close_connection(connection_id)
+            return
+
+        if error:
+            entry["attempts"] += 1
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (entry["attempts"] - 1))
+            entry.update({
+                "status": "backoff",
+                "connection_id": None,
+                "error": error,
+                "retry_at": time.time() + delay * random.uniform(0.8, 1.2),
+            })
+            return
+
+        client = self.ssh_manager.get_connection(connection_id)
+        client.get_transport().set_keepalive(KEEPALIVE_INTERVAL)
+        self._params[config['id']] = self._connect_key(config)
+        entry.update({
+            "status": "ready",
+            "connection_id": connection_id,
+            "error": None,
+            "attempts": 0,
+            "retry_at": 0,
+            "connected_at": time.time(),
+            "connect_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+
+    async def _check(self):
+        """检查连接状态，重连已断开且到达重试时间的主机"""
+        now = time.time()
+        due = []
+        for config in self._sync():
+            entry = self.hosts[config['id']]
+            if entry["status"] == "ready":
+                if self._is_alive(entry["connection_id"]):
+                    continue
+                # 连接已断开，立即重连
+                entry.update({"status": "pending", "error": "连接已断开"})
+            if entry["status"] in ("pending", "backoff") and entry["retry_at"] <= now:
+                due.append(config)
+        await asyncio.gather(*(self._connect(c) for c in due))
+
+    async def _run(self):
+        while True:
+            try:
+                await self._check()
+            except Exception as e:
+                print(f"预热连接检查失败: {e}")
+            if not self.ready:
+                self.ready = True
+                self._ready_event.set()
+            await asyncio.sleep(CHECK_INTERVAL)
+
+    def start(self) -> asyncio.Task:
+        """在后台启动预热与健康检查"""
+        if self._task is None:
+            self._semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+            self._ready_event = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def wait_ready(self):
+        """等待首轮预热完成"""
+        if self._task is not None:
+            await self._ready_event.wait()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def connection_for(self, config_id: str) -> Optional[str]:
+        """返回配置对应的可用预热连接"""
+        entry = self.hosts.get(config_id)
+        if entry and entry["status"] == "ready" and self._is_alive(entry["connection_id"]):
+            return entry["connection_id"]
+        return None
+
+    async def acquire(self, config_id: str) -> tuple:
+        """
+        获取配置对应的预热连接，已断开时立即重连（不等待退避）
+
+        返回: (connection_id, error)，配置未预热时均为 None
+        """
+        if self._task is None or config_id not in self.hosts:
+            return None, None
+        connection_id = self.connection_for(config_id)
+        if connection_id:
+            return connection_id, None
+        config = self._flagged_configs().get(config_id)
+        if config is None:
+            return None, None
+        await self._connect(config)
+        entry = self.hosts.get(config_id) or {}
+        return self.connection_for(config_id), entry.get("error")
+
+    def is_warm(self, connection_id: str) -> bool:
+        """连接是否为预热连接（由所有使用该配置的会话共享）"""
+        return any(h["connection_id"] == connection_id for h in self.hosts.values())
+
+    def snapshot(self) -> dict:
+        hosts = list(self.hosts.values())
+        return {
+            "ready": self.ready,
+            "total": len(hosts),
+            "warm": sum(1 for h in hosts if h["status"] == "ready"),
+            "hosts": hosts,
+        }
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+镜像预拉取
+汇总所选应用需要的镜像，跳过主机上已有的镜像，并发拉取其余镜像
+"""
+
+import queue
+import re
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+from ssh_manager import SSHManager
+
+# 并发拉取上限（sshd 默认 MaxSessions 为 10）
+MAX_CONCURRENCY = 6
+
+_PULL_PATTERN = re.compile(r'docker\s+pull\s+([^\s;|&)]+)')
+
+
+def extract_images(script: str) -> List[str]:
+    """从安装脚本的 docker pull 语句中提取镜像（忽略包含变量的镜像名）"""
+    images = []
+    for image in _PULL_PATTERN.findall(script or ''):
+        image = image.strip('"\'')
+        if '$' not in image and image not in images:
+            images.append(image)
+    return images
+
+
+def normalize_image(image: str) -> str:
+    """统一镜像名称：去掉 Docker Hub 默认前缀，补全 latest 标签"""
+    for prefix in ("docker.io/", "index.docker.io/"):
+        if image.startswith(prefix):
+            image = image[len(prefix):]
+    if image.startswith("library/"):
+        image = image[len("library/"):]
+    name = image.rsplit('/', 1)[-1]
+    if ':' not in name and '@' not in name:
+        image += ":latest"
+    return image
+
+
+def docker_cmd(sudo_password: Optional[str] = None) -> str:
+    """
+    在远程主机上定义 D 函数调用 docker
+
+    当前用户无权访问 docker.sock 时通过 sudo 执行：提供了密码时用 sudo -S 传入，
+    否则尝试免密 sudo
+    """
+    if sudo_password:
+        sudo = f"printf '%s\\n' {shlex.quote(sudo_password)} | sudo -S -p '' docker"
+    else:
+        sudo = "sudo -n docker"
+    return (
+        'if [ -w /var/run/docker.sock ]; then D() { docker "$@"; }; '
+        f'else D() {{ {sudo} "$@"; }}; fi; '
+    )
+
+
+def list_local_images(ssh_manager: SSHManager, connection_id: str,
+                      sudo_password: Optional[str] = None) -> tuple:
+    """
+    列出远程主机已有的镜像
+
+    返回: (镜像集合, error_message)
+    """
+    stdout, stderr, exit_code = ssh_manager.execute_command(
+        connection_id,
+        docker_cmd(sudo_password) + "D images --format '{{.Repository}}:{{.Tag}}'"
+    )
+    if exit_code != 0:
+        return set(), (stderr or "").strip() or "无法获取镜像列表"
+    return {
+        normalize_image(line.strip())
+        for line in stdout.splitlines()
+        if line.strip() and not line.endswith(':<none>')
+    }, None
+
+
+def pull_command(image: str, mirror: Optional[str] = None,
+                 sudo_password: Optional[str] = None) -> str:
+    """生成拉取命令（配置了加速源时优先从加速源拉取再打回原标签）"""
+    quoted = shlex.quote(image)
+    if not mirror:
+        return docker_cmd(sudo_password) + f"D pull {quoted}"
+    mirrored = shlex.quote(f"{mirror.rstrip('/')}/{image}")
+    return docker_cmd(sudo_password) + (
+        f"{{ D pull {mirrored} && D tag {mirrored} {quoted} && "
+        f"{{ D rmi {mirrored} >/dev/null 2>&1; true; }}; }} || "
+        f"{{ echo '加速源失败，使用官方源...'; D pull {quoted}; }}"
+    )
+
+
+def prepull_events(ssh_manager: SSHManager, connection_id: str, images: List[str],
+                   concurrency: int = 3, mirror: Optional[str] = None,
+                   sudo_password: Optional[str] = None) -> Iterator[dict]:
+    """
+    预拉取镜像，逐条产出进度事件
+
+    sudo_password: 当前用户无权访问 docker.sock 时用于 sudo 的密码
+    事件类型: plan / start / progress / done / summary / error（无法获取本地镜像时以 error 结束）
+    """
+    started = time.time()
+
+    wanted = []
+    for image in images:
+        image = normalize_image(image.strip())
+        if image not in wanted:
+            wanted.append(image)
+
+    local, error = list_local_images(ssh_manager, connection_id, sudo_password)
+    if error:
+        # 无法访问 docker 时逐个拉取也会以同样的原因失败
+        yield {"type": "error", "message": f"获取本地镜像失败: {error}"}
+        return
+
+    missing = [image for image in wanted if image not in local]
+    yield {
+        "type": "plan",
+        "images": wanted,
+        "present": [image for image in wanted if image in local],
+        "missing": missing,
+    }
+
+    events: queue.Queue = queue.Queue()
+
+    def pull(image: str):
+        events.put({"type": "start", "image": image})
+        start = time.time()
+        exit_code, error = ssh_manager.stream_command(
+            connection_id,
+            pull_command(image, mirror, sudo_password),
+            lambda line: events.put({"type": "progress", "image": image, "line": line})
+        )
+        events.put({
+            "type": "done",
+            "image": image,
+            "success": exit_code == 0,
+            "error": error,
+            "duration": round(time.time() - start, 2),
+        })
+
+    failed = []
+    if missing:
+        workers = max(1, min(concurrency, MAX_CONCURRENCY, len(missing)))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for image in missing:
+                executor.submit(pull, image)
+
+            remaining = len(missing)
+            while remaining:
+                event = events.get()
+                if event["type"] == "done":
+                    remaining -= 1
+                    if not event["success"]:
+                        failed.append(event["image"])
+                yield event
+        finally:
+            executor.shutdown(wait=False)
+
+    yield {
+        "type": "summary",
+        "pulled": len(missing) - len(failed),
+        "failed": failed,
+        "skipped": len(wanted) - len(missing),
+        "duration": round(time.time() - started, 2),
+    }
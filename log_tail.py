@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程日志跟踪
+过滤（正则、级别、起始时间）在远程执行，只把匹配的行传回，并在服务端限速
+"""
+
+import re
+import shlex
+import time
+import warnings
+from typing import List, Optional
+
+from image_prepull import docker_cmd
+
+# 级别过滤：保留该级别及更严重的日志（不区分大小写）
+LEVEL_PATTERNS = {
+    "error": r"(error|err|fatal|crit|critical|panic)",
+    "warn": r"(warn|warning|error|err|fatal|crit|critical|panic)",
+    "info": r"(info|warn|warning|error|err|fatal|crit|critical|panic)",
+}
+
+# grep -E（POSIX ERE）不支持的 Perl 风格转义，避免校验通过后远程匹配不到任何内容
+_PERL_ESCAPES = set("dDtnrfvxpPAZzhHK")
+
+# grep 错误输出的行前缀（远程经 sed 添加，服务端据此识别并作为错误返回）
+GREP_ERROR_PREFIX = "__DOCKSSH_GREP_ERROR__ "
+
+# docker logs --since 接受的格式：相对时间（10m、1h30m）或时间戳
+_SINCE_PATTERN = re.compile(r"^(\d+[smh])+$|^\d{4}-\d{2}-\d{2}([T ][\d:.]+)?(Z|[+-]\d{2}:?\d{2})?$|^\d+$")
+
+
+def validate_ere(pattern: str):
+    """校验正则表达式可用于 grep -E，拒绝 Perl 专有语法"""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            if pattern[i + 1] in _PERL_ESCAPES:
+                raise ValueError(
+                    f"grep -E 不支持 \\{pattern[i + 1]}，请改用 POSIX 写法（如 [0-9] 代替 \\d）"
+                )
+            i += 2
+            continue
+        if char == "(" and pattern[i + 1:i + 2] == "?":
+            raise ValueError("grep -E 不支持 (?...) 语法（如 (?i)、前后查找），忽略大小写请使用 ignore_case")
+        if char in "*+?}" and pattern[i + 1:i + 2] in ("?", "+"):
+            raise ValueError("grep -E 不支持非贪婪或占有量词（如 *?、+?）")
+        i += 1
+    try:
+        # POSIX 字符类（如 [[:digit:]]）在 Python 中会触发 FutureWarning，但在 ERE 中合法
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"无效的正则表达式: {e}")
+
+
+def _grep(flags: str, pattern: str) -> str:
+    """
+    生成 grep 过滤阶段
+
+    grep 的错误输出加上 GREP_ERROR_PREFIX 后写回标准输出（通过 pty 时
+    stdout 与 stderr 无法区分），正常匹配的行原样输出；前一阶段的错误行
+    直接放行，不受本阶段过滤。
+    """
+    pattern = f"^{GREP_ERROR_PREFIX}|({pattern})"
+    return (
+        f"{{ grep --line-buffered {flags} {shlex.quote(pattern)} 2>&1 >&3 3>&- "
+        f"| sed 's/^/{GREP_ERROR_PREFIX}/' >&3 3>&-; }} 3>&1"
+    )
+
+
+def build_tail_command(container: Optional[str] = None, path: Optional[str] = None,
+                       pattern: Optional[str] = None, level: Optional[str] = None,
+                       since: Optional[str] = None, tail: int = 100,
+                       ignore_case: bool = False) -> str:
+    """
+    生成远程跟踪命令
+
+    container 与 path 二选一；since 仅支持容器日志。
+    """
+    if bool(container) == bool(path):
+        raise ValueError("必须指定 container 或 path 其中之一")
+    level = level.lower() if level else None
+    if level and level not in LEVEL_PATTERNS and level != "debug":
+        raise ValueError(f"不支持的日志级别: {level}")
+    if since and not _SINCE_PATTERN.match(since):
+        raise ValueError(f"无效的起始时间: {since}")
+    if pattern:
+        validate_ere(pattern)
+
+    tail = max(0, int(tail))
+    if container:
+        since_arg = f" --since {shlex.quote(since)}" if since else ""
+        command = docker_cmd() + f"D logs -f --tail {tail}{since_arg} {shlex.quote(container)} 2>&1"
+    else:
+        if since:
+            raise ValueError("文件日志不支持 since 参数")
+        command = f"tail -n {tail} -F {shlex.quote(path)} 2>&1"
+
+    if pattern:
+        command += " | " + _grep("-iE" if ignore_case else "-E", pattern)
+    if level in LEVEL_PATTERNS:
+        command += " | " + _grep("-iE", LEVEL_PATTERNS[level])
+    return command
+
+
+class RateLimiter:
+    """令牌桶限速（按行计数）"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class LineBatcher:
+    """按行切分远程输出，并经限速后攒批"""
+
+    def __init__(self, rate: float, max_batch: int = 500):
+        self.limiter = RateLimiter(rate)
+        self.max_batch = max_batch
+        self.partial = ""
+        self.pending: List[str] = []
+        self.errors: List[str] = []
+        self.sent = 0
+        self.dropped = 0
+
+    def feed(self, data: str):
+        lines = (self.partial + data).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            line = line.rstrip("\r")
+            if line.startswith(GREP_ERROR_PREFIX):
+                self.errors.append(line[len(GREP_ERROR_PREFIX):])
+                continue
+            if self.limiter.allow() and len(self.pending) < self.max_batch:
+                self.pending.append(line)
+            else:
+                self.dropped += 1
+
+    def flush(self) -> List[str]:
+        batch, self.pending = self.pending, []
+        self.sent += len(batch)
+        return batch
+
+    def take_errors(self) -> List[str]:
+        errors, self.errors = self.errors, []
+        return errors
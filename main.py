@@ -5,17 +5,30 @@ DockSSH - SSH 远程管理与 Docker 应用中心
 主入口文件
 """
 
-import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from fastapi.middleware.cors import CORSMiddleware
-import json
 import os
-from pathlib import Path
+import sys
 
-from api import ssh_router, docker_router, ssh_manager
-from ssh_manager import SSHManager
+import startup
+
+with startup.timed("import:fastapi"):
+    from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+    from fastapi.middleware.cors import CORSMiddleware
+
+# paramiko / httpx 在 api 中按需加载，启动后由后台预热
+with startup.timed("import:api"):
+    from api import ssh_router, docker_router, artifact_router, ssh_manager, prewarmer, DATA_DIR
+
+with startup.timed("import:static_assets"):
+    import static_assets
+
+with startup.timed("import:log_tail"):
+    import log_tail
+
+with startup.timed("import:terminal_sessions"):
+    import terminal_sessions
+
+# 设置 DOCKSSH_PROFILE_STARTUP=1 时在预热完成后输出启动耗时报告
+PROFILE_STARTUP = os.environ.get("DOCKSSH_PROFILE_STARTUP") == "1"
 
 # 创建 FastAPI 应用
 app = FastAPI(title="DockSSH", description="SSH 远程管理与 Docker 应用中心", version="1.0.0")
@@ -27,30 +40,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 # 注册路由（必须在挂载静态文件之前）
 app.include_router(ssh_router, prefix="/api/ssh", tags=["SSH 管理"])
 app.include_router(docker_router, prefix="/api/docker", tags=["Docker 应用"])
+app.include_router(artifact_router, prefix="/api/artifacts", tags=["制品缓存"])
 
 # 挂载静态文件（放在最后，避免拦截API路由）
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", static_assets.AssetFiles(directory="static"), name="static")
+
+# 指纹与预压缩文件在后台生成，完成前首页引用原始路径
+startup.register_warmup("assets", static_assets.build_assets)
+
+
+async def _prewarm_connections():
+    """并发连接标记了 prewarm 的 SSH 配置，首轮完成即视为就绪，之后在后台保持"""
+    prewarmer.start()
+    await prewarmer.wait_ready()
+
+
+startup.register_warmup("prewarm", _prewarm_connections)
 
 
 @app.get("/")
-async def root():
+async def root(request: Request):
     """返回首页"""
-    return FileResponse("static/index.html")
+    return static_assets.index_response(request)
+
+
+@app.get("/api/startup")
+async def startup_status():
+    """启动状态、各子系统耗时与预热连接状态"""
+    return {**startup.snapshot(), "prewarm": prewarmer.snapshot()}
 
 
 @app.websocket("/ws/terminal/{connection_id}")
-async def websocket_terminal(websocket: WebSocket, connection_id: str):
-    """WebSocket 终端连接"""
-    import asyncio
-    import select
+async def websocket_terminal(websocket: WebSocket, connection_id: str,
+                             session: str = None, mode: str = "write", new: bool = False):
+    """
+    WebSocket 终端连接
     
+    默认加入该连接正在运行的共享会话，没有时新建 shell；
+    指定 session 时加入该会话，new=1 时总是新建 shell；
+    mode=view 时只观看，写入者离开后由最早加入的 write 订阅者接替
+    """
     await websocket.accept()
-    channel = None
+    terminal = None
+    subscriber = None
     
     try:
         # 获取 SSH 连接
@@ -63,62 +101,154 @@ async def websocket_terminal(websocket: WebSocket, connection_id: str):
             await websocket.close()
             return
         
-        # 创建交互式 shell
-        channel = ssh_client.invoke_shell(term='xterm', width=120, height=40)
-        channel.setblocking(0)  # 非阻塞模式
+        if session:
+            terminal = terminal_sessions.get_session(session, connection_id)
+            if not terminal:
+                await websocket.send_json({
+                    "type": "error",
+                    "data": "终端会话不存在或已结束"
+                })
+                await websocket.close()
+                return
+        elif not new:
+            terminal = terminal_sessions.find_session(connection_id)
+        
+        if terminal is None:
+            # 创建交互式 shell
+            channel = ssh_client.invoke_shell(term='xterm', width=120, height=40)
+            channel.setblocking(0)  # 非阻塞模式
+            terminal = terminal_sessions.create_session(connection_id, channel)
+        
+        # connected 消息与最近输出由会话先行投递
+        subscriber = terminal.subscribe(websocket, wants_write=(mode != "view"))
+        
+        # 从前端接收输入，仅写入者的输入会发送到 SSH
+        while True:
+            data = await websocket.receive_text()
+            if data:
+                terminal.write(subscriber, data)
+                
+    except WebSocketDisconnect:
+        print(f"WebSocket 断开: {connection_id}")
+    except Exception as e:
+        print(f"WebSocket 错误: {e}")
+        try:
+            await websocket.send_json({
+                "type": "error",
+                "data": str(e)
+            })
+        except:
+            pass
+    finally:
+        # 最后一个订阅者离开时关闭 shell
+        if terminal and subscriber:
+            await terminal.unsubscribe(subscriber)
+        try:
+            await websocket.close()
+        except:
+            pass
+
+
+@app.websocket("/ws/logs/{connection_id}")
+async def websocket_logs(websocket: WebSocket, connection_id: str,
+                         container: str = None, path: str = None,
+                         pattern: str = None, level: str = None, since: str = None,
+                         tail: int = 100, ignore_case: bool = False,
+                         rate: int = 200, interval: int = 250):
+    """
+    远程日志跟踪
+    
+    过滤在远程执行，匹配的行按 interval 毫秒攒批推送；
+    超过 rate 行/秒的部分在服务端丢弃并计数
+    """
+    import asyncio
+    
+    await websocket.accept()
+    channel = None
+    
+    try:
+        ssh_client = ssh_manager.get_connection(connection_id)
+        if not ssh_client:
+            await websocket.send_json({"type": "error", "data": "SSH 连接不存在或已断开"})
+            await websocket.close()
+            return
+        
+        try:
+            command = log_tail.build_tail_command(
+                container=container, path=path, pattern=pattern,
+                level=level, since=since, tail=tail, ignore_case=ignore_case
+            )
+        except ValueError as e:
+            await websocket.send_json({"type": "error", "data": str(e)})
+            await websocket.close()
+            return
+        
+        # 使用 pty，断开时远程跟踪进程会随之结束
+        channel = ssh_client.get_transport().open_session(timeout=30)
+        channel.get_pty(term='dumb', width=500)
+        channel.exec_command(command)
+        channel.setblocking(0)
         
-        await websocket.send_json({
-            "type": "connected",
-            "data": "终端已连接\r\n"
-        })
+        await websocket.send_json({"type": "connected", "data": command})
+        
+        batcher = log_tail.LineBatcher(rate=max(1, min(rate, 5000)))
+        interval_s = max(50, min(interval, 5000)) / 1000
         
-        # 创建异步任务
         async def read_from_ssh():
-            """从 SSH 读取数据并发送到前端"""
+            """读取远程输出并按批推送"""
+            reported_dropped = 0
             while True:
-                try:
-                    # 使用 select 检查是否有数据可读
-                    if channel.recv_ready():
-                        output = channel.recv(8192).decode('utf-8', errors='ignore')
-                        if output:
-                            await websocket.send_json({
-                                "type": "output",
-                                "data": output
-                            })
-                    await asyncio.sleep(0.01)  # 10ms 轮询间隔
-                except Exception as e:
-                    print(f"读取 SSH 输出错误: {e}")
+                while channel.recv_ready():
+                    batcher.feed(channel.recv(65536).decode('utf-8', errors='ignore'))
+                
+                # 远程 grep 出错时过滤已失效，返回错误并结束跟踪
+                errors = batcher.take_errors()
+                if errors:
+                    for error in errors:
+                        await websocket.send_json({"type": "error", "data": error})
                     break
+                
+                lines = batcher.flush()
+                if lines or batcher.dropped != reported_dropped:
+                    reported_dropped = batcher.dropped
+                    await websocket.send_json({
+                        "type": "lines",
+                        "lines": lines,
+                        "sent": batcher.sent,
+                        "dropped": batcher.dropped
+                    })
+                
+                if channel.exit_status_ready() and not channel.recv_ready():
+                    await websocket.send_json({
+                        "type": "end",
+                        "exit_code": channel.recv_exit_status(),
+                        "sent": batcher.sent,
+                        "dropped": batcher.dropped
+                    })
+                    break
+                await asyncio.sleep(interval_s)
         
-        async def write_to_ssh():
-            """从前端接收输入并发送到 SSH"""
+        async def wait_for_disconnect():
+            """客户端断开时结束跟踪"""
             while True:
                 try:
-                    data = await websocket.receive_text()
-                    if data:
-                        channel.send(data)
+                    await websocket.receive_text()
                 except WebSocketDisconnect:
                     break
-                except Exception as e:
-                    print(f"写入 SSH 输入错误: {e}")
+                except Exception:
                     break
         
-        # 并发执行读写任务
-        await asyncio.gather(
-            read_from_ssh(),
-            write_to_ssh(),
-            return_exceptions=True
-        )
-                
+        tasks = [asyncio.create_task(read_from_ssh()), asyncio.create_task(wait_for_disconnect())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+    
     except WebSocketDisconnect:
-        print(f"WebSocket 断开: {connection_id}")
+        print(f"日志 WebSocket 断开: {connection_id}")
     except Exception as e:
-        print(f"WebSocket 错误: {e}")
+        print(f"日志 WebSocket 错误: {e}")
         try:
-            await websocket.send_json({
-                "type": "error",
-                "data": str(e)
-            })
+            await websocket.send_json({"type": "error", "data": str(e)})
         except:
             pass
     finally:
@@ -136,16 +266,14 @@ async def websocket_terminal(websocket: WebSocket, connection_id: str):
 @app.on_event("startup")
 async def startup_event():
     """启动时初始化"""
-    # 创建必要的目录
-    Path("data").mkdir(exist_ok=True)
-    Path("static").mkdir(exist_ok=True)
+    # 数据文件缺失时按空列表处理，这里只需保证目录存在
+    with startup.timed("init:data_dir"):
+        DATA_DIR.mkdir(exist_ok=True)
     
-    # 初始化数据文件
-    for filename in ["ssh_configs.json", "docker_apps.json"]:
-        filepath = Path("data") / filename
-        if not filepath.exists():
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
+    # SSH、应用库等子系统在后台预热，首页无需等待
+    task = startup.start_warm_up()
+    if PROFILE_STARTUP:
+        task.add_done_callback(lambda _: print(startup.report()))
     
     print("🚀 DockSSH 启动成功!")
     print("📍 访问地址: http://localhost:8000")
@@ -154,16 +282,35 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """关闭时清理"""
+    terminal_sessions.close_all()
+    prewarmer.stop()
     ssh_manager.close_all()
     print("👋 DockSSH 已关闭")
 
 
+async def profile_startup():
+    """启动性能分析：执行启动流程并等待预热完成后输出报告"""
+    # 只分析本地启动耗时，不建立真实的预热连接
+    startup.unregister_warmup("prewarm")
+    with startup.timed("init:startup_event"):
+        await startup_event()
+    await startup.wait_ready()
+    print(startup.report())
+
+
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        import asyncio
+        asyncio.run(profile_startup())
+        sys.exit(0)
+    
+    import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        # 热重载会额外启动监控进程，仅在开发时通过 DOCKSSH_RELOAD=1 开启
+        reload=os.environ.get("DOCKSSH_RELOAD") == "1",
         log_level="info"
     )
 
@@ -22,9 +22,15 @@ mkdir -p "$DOCKER_DIR/moviepilot/config" "$DOCKER_DIR/moviepilot/core" "$MEDIA_D
 echo "➤ [2/6] 下载 MoviePilot 配置文件..."
 DOWNLOAD_URL="https://dockpilot.oss-cn-shanghai.aliyuncs.com/moviepilot.tgz"
 TEMP_FILE="/tmp/moviepilot.tgz"
+# DockSSH 制品缓存地址由安装流程通过 DOCKSSH_ARTIFACTS 传入，不可用时从 OSS 下载
+if [ -n "$DOCKSSH_ARTIFACTS" ] && curl -fsS --connect-timeout 2 -o "$TEMP_FILE" "$DOCKSSH_ARTIFACTS/moviepilot.tgz" 2>/dev/null && [ -s "$TEMP_FILE" ]; then
+    DOWNLOADED="本地缓存"
+elif curl -sS -L -o "$TEMP_FILE" "$DOWNLOAD_URL" && [ -s "$TEMP_FILE" ]; then
+    DOWNLOADED="OSS"
+fi
 
-if curl -sS -L -o "$TEMP_FILE" "$DOWNLOAD_URL" && [ -s "$TEMP_FILE" ]; then
-    echo "   ✓ 配置文件下载成功"
+if [ -n "$DOWNLOADED" ]; then
+    echo "   ✓ 配置文件下载成功（$DOWNLOADED）"
     echo "     解压配置文件..."
     cd "$DOCKER_DIR/moviepilot"
     tar -zxf "$TEMP_FILE" --strip-components=1 2>/dev/null || tar -zxf "$TEMP_FILE"
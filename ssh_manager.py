@@ -5,65 +5,229 @@ SSH 连接管理器
 负责 SSH 连接的创建、维护和销毁
 """
 
-import paramiko
+import os
+import re
+import shlex
 import uuid
 import time
-from typing import Dict, Optional
+import socket
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, TYPE_CHECKING
 import io
 
+# paramiko 连带加载 cryptography，耗时较长，在首次使用时再导入
+if TYPE_CHECKING:
+    import paramiko
+
+# 超过该耗时（毫秒）的连接/命令记入慢操作记录
+SLOW_OPERATION_MS = 1000
+
+# 慢操作记录保留条数
+SLOW_OPERATION_HISTORY = 100
+
+# 连接配置档：首选的加密、MAC、密钥交换算法及是否启用 zlib 压缩
+# 列出的算法排在协商列表最前，其余算法保留作为兜底；当前 paramiko
+# 不支持的算法（如 AES-GCM、chacha20-poly1305）会被忽略
+CONNECTION_PROFILES = {
+    "default": {
+        "description": "paramiko 默认协商",
+    },
+    "aes-fast": {
+        "description": "AES-128-CTR + ETM MAC，适合带 AES 硬件加速的 x86/ARMv8 CPU",
+        "ciphers": ["aes128-ctr"],
+        "macs": ["hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"],
+        "kex": ["curve25519-sha256@libssh.org", "ecdh-sha2-nistp256"],
+    },
+    "low-cpu": {
+        "description": "AES-128-CTR + HMAC-SHA1，适合无 SHA2 加速的低功耗 ARM NAS",
+        "ciphers": ["aes128-ctr"],
+        "macs": ["hmac-sha1", "hmac-sha2-256"],
+        "kex": ["curve25519-sha256@libssh.org"],
+    },
+    "compressed": {
+        "description": "启用 zlib 压缩，适合慢速广域网及日志、docker pull 等可压缩输出",
+        "ciphers": ["aes128-ctr"],
+        "macs": ["hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"],
+        "kex": ["curve25519-sha256@libssh.org", "ecdh-sha2-nistp256"],
+        "compress": True,
+    },
+}
+
+# 未指定配置档时使用的全局默认值（无效时回退到 default，避免所有连接失败）
+DEFAULT_PROFILE = os.environ.get("DOCKSSH_SSH_PROFILE", "default")
+if DEFAULT_PROFILE not in CONNECTION_PROFILES:
+    print(f"⚠️ 未知的连接配置档 DOCKSSH_SSH_PROFILE={DEFAULT_PROFILE}，"
+          f"可选: {', '.join(CONNECTION_PROFILES)}，已使用 default")
+    DEFAULT_PROFILE = "default"
+
+# 吞吐测试数据（在远程生成到临时文件，不计入测量时间）
+# random: 不可压缩数据，接近镜像、压缩包等二进制传输
+# text: 日志风格文本，接近 docker logs、命令输出等可压缩输出
+THROUGHPUT_WORKLOADS = {
+    "random": "head -c {size} /dev/urandom",
+    "text": (
+        "awk 'BEGIN {{ srand(); for (i = 0; ; i++) printf \"%d INFO worker-%d handled "
+        "request id=%08x status=%d in %dms\\n\", i, i % 16, int(rand() * 2147483647), "
+        "(rand() < 0.9 ? 200 : 500), int(rand() * 500) }}' | head -c {size}"
+    ),
+}
+
+# 配置档字段 -> paramiko SecurityOptions 属性
+_PROFILE_OPTIONS = {"ciphers": "ciphers", "macs": "digests", "kex": "kex"}
+
+
+def _transport_factory(profile: dict, timer: "PhaseTimer"):
+    """
+    生成按配置档调整算法顺序的 Transport 工厂（供 SSHClient.connect 使用）
+    
+    同时在传输线程收到服务端横幅时记录 banner 阶段，与之后的密钥协商分开计时
+    """
+    import paramiko
+    
+    def factory(sock, **kwargs):
+        transport = paramiko.Transport(sock, **kwargs)
+        check_banner = transport._check_banner
+        
+        def timed_check_banner():
+            check_banner()
+            timer.mark("banner")
+        
+        transport._check_banner = timed_check_banner
+        options = transport.get_security_options()
+        for key, attr in _PROFILE_OPTIONS.items():
+            supported = getattr(options, attr)
+            preferred = [a for a in profile.get(key, []) if a in supported]
+            if preferred:
+                setattr(options, attr, preferred + [a for a in supported if a not in preferred])
+        return transport
+    
+    return factory
+
+
+class PhaseTimer:
+    """分阶段计时器"""
+    
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._start = time.perf_counter()
+        self._last = self._start
+    
+    @contextmanager
+    def phase(self, name: str):
+        """记录代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0.0) + (self._last - start) * 1000
+    
+    def mark(self, name: str):
+        """记录从上一阶段结束到现在的耗时"""
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + (now - self._last) * 1000
+        self._last = now
+    
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+    
+    def as_dict(self) -> dict:
+        return {
+            'phases': {name: round(ms, 1) for name, ms in self.phases.items()},
+            'total': round(self.total_ms(), 1),
+        }
+    
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头"""
+        items = [f"{name};dur={ms:.1f}" for name, ms in self.phases.items()]
+        items.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(items)
+
+
+class _TimedAuth:
+    """
+    认证策略（供 SSHClient.connect 的 auth_strategy 使用）
+    paramiko 在密钥协商完成后调用 authenticate，借此区分密钥协商与认证耗时
+    """
+    
+    def __init__(self, timer: PhaseTimer, username: str, password: str = None, pkey=None):
+        self.timer = timer
+        self.username = username
+        self.password = password
+        self.pkey = pkey
+    
+    def authenticate(self, transport):
+        # 横幅之后的密钥协商和主机密钥校验
+        self.timer.mark("kex")
+        with self.timer.phase("auth"):
+            if self.pkey is not None:
+                return transport.auth_publickey(self.username, self.pkey)
+            return transport.auth_password(self.username, self.password)
+
 
 class SSHManager:
     """SSH 连接管理器"""
     
     def __init__(self):
         self.connections: Dict[str, dict] = {}
+        self.slow_operations: deque = deque(maxlen=SLOW_OPERATION_HISTORY)
+        self.close_listeners: List[Callable[[str], None]] = []  # 连接关闭后回调，参数为 connection_id
     
     def create_connection(self, host: str, port: int, username: str, 
-                         password: str = None, private_key: str = None, name: str = None) -> tuple:
+                         password: str = None, private_key: str = None, name: str = None,
+                         timer: "PhaseTimer" = None, profile: str = None) -> tuple:
         """
         创建 SSH 连接
         
+        timer: 可选的阶段计时器，记录 import/key/dns/tcp/banner/kex/auth 各阶段耗时
+        profile: 连接配置档名称，默认使用 DEFAULT_PROFILE
         返回: (connection_id, error_message)
         """
+        timer = timer or PhaseTimer()
+        # 启动后首次连接时才导入 paramiko，单独计时以免计入总耗时却不属于任何阶段
+        with timer.phase("import"):
+            import paramiko
+        
+        profile = profile or DEFAULT_PROFILE
+        if profile not in CONNECTION_PROFILES:
+            return None, f"未知的连接配置档: {profile}"
+        
+        target = f"{username}@{host}:{port}"
+        client = None
+        sock = None
         try:
-            # 创建 SSH 客户端
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # 连接参数
-            connect_kwargs = {
-                'hostname': host,
-                'port': port,
-                'username': username,
-                'timeout': 30,  # 增加超时时间到30秒
-                'banner_timeout': 30,
-                'auth_timeout': 30,
-            }
-            
             # 使用密码或私钥
+            pkey = None
             if private_key:
-                # 解析私钥
-                try:
-                    key_file = io.StringIO(private_key)
-                    pkey = paramiko.RSAKey.from_private_key(key_file)
-                    connect_kwargs['pkey'] = pkey
-                except:
-                    # 尝试其他密钥类型
-                    try:
-                        key_file = io.StringIO(private_key)
-                        pkey = paramiko.Ed25519Key.from_private_key(key_file)
-                        connect_kwargs['pkey'] = pkey
-                    except:
-                        key_file = io.StringIO(private_key)
-                        pkey = paramiko.ECDSAKey.from_private_key(key_file)
-                        connect_kwargs['pkey'] = pkey
-            elif password:
-                connect_kwargs['password'] = password
-            else:
+                with timer.phase("key"):
+                    pkey = self._load_private_key(private_key)
+            elif not password:
                 return None, "必须提供密码或私钥"
             
-            # 连接
-            client.connect(**connect_kwargs)
+            # 自行解析地址和建立 TCP 连接，以便分别计时
+            with timer.phase("dns"):
+                addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            with timer.phase("tcp"):
+                sock = self._open_socket(addresses, timeout=30)
+            
+            # 创建 SSH 客户端
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            
+            # 连接（横幅与密钥协商耗时分别在收到横幅和认证开始时记录）
+            client.connect(
+                hostname=host,
+                port=port,
+                username=username,
+                sock=sock,
+                timeout=30,  # 增加超时时间到30秒
+                banner_timeout=30,
+                auth_timeout=30,
+                auth_strategy=_TimedAuth(timer, username, password, pkey),
+                transport_factory=_transport_factory(CONNECTION_PROFILES[profile], timer),
+                compress=CONNECTION_PROFILES[profile].get("compress", False),
+            )
             
             # 生成唯一 ID
             connection_id = str(uuid.uuid4())
@@ -76,45 +240,337 @@ class SSHManager:
                 'username': username,
                 'name': name or f"{username}@{host}",
                 'created_at': time.time(),
+                'profile': profile,
             }
             
+            self._record_operation("connect", target, timer)
             return connection_id, None
             
         except paramiko.AuthenticationException:
-            return None, "认证失败: 用户名或密码/私钥错误"
+            error = "认证失败: 用户名或密码/私钥错误"
         except paramiko.SSHException as e:
-            return None, f"SSH 连接错误: {str(e)}"
+            error = f"SSH 连接错误: {str(e)}"
         except Exception as e:
-            return None, f"连接失败: {str(e)}"
+            error = f"连接失败: {str(e)}"
+        
+        for resource in (client, sock):
+            if resource:
+                try:
+                    resource.close()
+                except:
+                    pass
+        self._record_operation("connect", target, timer, error)
+        return None, error
     
-    def get_connection(self, connection_id: str) -> Optional[paramiko.SSHClient]:
+    @staticmethod
+    def _load_private_key(private_key: str):
+        """解析私钥（依次尝试 RSA、Ed25519、ECDSA）"""
+        import paramiko
+        
+        for key_class in (paramiko.RSAKey, paramiko.Ed25519Key):
+            try:
+                return key_class.from_private_key(io.StringIO(private_key))
+            except Exception:
+                pass
+        return paramiko.ECDSAKey.from_private_key(io.StringIO(private_key))
+    
+    @staticmethod
+    def _open_socket(addresses: list, timeout: float) -> socket.socket:
+        """依次尝试解析出的地址，返回第一个连接成功的 socket"""
+        last_error = None
+        for family, socktype, proto, _, address in addresses:
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(address)
+                return sock
+            except OSError as e:
+                sock.close()
+                last_error = e
+        raise last_error or OSError("无可用地址")
+    
+    def _record_operation(self, operation: str, target: str, timer: "PhaseTimer",
+                          error: str = None):
+        """记录超过阈值的慢操作"""
+        total_ms = timer.total_ms()
+        if total_ms < SLOW_OPERATION_MS:
+            return
+        self.slow_operations.append({
+            'operation': operation,
+            'target': target,
+            'at': time.time(),
+            'total_ms': round(total_ms, 1),
+            'phases': timer.as_dict()['phases'],
+            'error': error,
+        })
+    
+    def get_connection(self, connection_id: str) -> Optional["paramiko.SSHClient"]:
         """获取 SSH 连接"""
         conn = self.connections.get(connection_id)
         if conn:
             return conn['client']
         return None
     
-    def execute_command(self, connection_id: str, command: str) -> tuple:
+    def execute_command(self, connection_id: str, command: str,
+                        timer: "PhaseTimer" = None) -> tuple:
         """
         执行命令
         
+        timer: 可选的阶段计时器，记录 channel/exec/read 各阶段耗时
         返回: (stdout, stderr, exit_code)
         """
         client = self.get_connection(connection_id)
         if not client:
             return None, "连接不存在", -1
         
+        timer = timer or PhaseTimer()
+        conn = self.connections[connection_id]
+        target = f"{conn['username']}@{conn['host']}:{conn['port']}"
+        channel = None
         try:
-            stdin, stdout, stderr = client.exec_command(command, timeout=300)
-            exit_code = stdout.channel.recv_exit_status()
+            with timer.phase("channel"):
+                channel = client.get_transport().open_session(timeout=300)
+                channel.settimeout(300)
+            
+            with timer.phase("exec"):
+                channel.exec_command(command)
+                stdout = channel.makefile('rb')
+                stderr = channel.makefile_stderr('rb')
+                exit_code = channel.recv_exit_status()
             
-            stdout_text = stdout.read().decode('utf-8', errors='ignore')
-            stderr_text = stderr.read().decode('utf-8', errors='ignore')
+            with timer.phase("read"):
+                stdout_text = stdout.read().decode('utf-8', errors='ignore')
+                stderr_text = stderr.read().decode('utf-8', errors='ignore')
             
+            self._record_operation("execute", target, timer)
             return stdout_text, stderr_text, exit_code
             
         except Exception as e:
+            self._record_operation("execute", target, timer, str(e))
             return None, str(e), -1
+        finally:
+            # 失败或超时时同样关闭通道，避免占用 sshd 的 MaxSessions
+            if channel is not None:
+                channel.close()
+    
+    def stream_command(self, connection_id: str, command: str,
+                       on_line: Callable[[str], None], timeout: float = 1800) -> tuple:
+        """
+        执行命令并逐行回调输出（stderr 合并到 stdout）
+        
+        返回: (exit_code, error_message)
+        """
+        client = self.get_connection(connection_id)
+        if not client:
+            return -1, "连接不存在"
+        
+        try:
+            channel = client.get_transport().open_session(timeout=30)
+            channel.settimeout(timeout)
+            channel.set_combine_stderr(True)
+            channel.exec_command(command)
+            
+            for line in channel.makefile('rb'):
+                on_line(line.decode('utf-8', errors='ignore').rstrip('\r\n'))
+            
+            exit_code = channel.recv_exit_status()
+            channel.close()
+            return exit_code, None
+            
+        except Exception as e:
+            return -1, str(e)
+    
+    def execute_batch(self, connection_id: str, commands: List[str],
+                      stop_on_error: bool = True, timeout: float = 1800) -> Iterator[dict]:
+        """
+        在同一个远程 shell 中依次执行多条命令，按顺序逐条产出结果
+        
+        所有命令一次性写入 shell 的标准输入，每条命令结束后在 stdout 和 stderr
+        中输出标记，据此切分各命令的输出、退出码和耗时。命令之间共享工作目录
+        和环境变量，各命令的标准输入重定向到 /dev/null。
+        
+        结果 status: ok / failed / aborted（shell 提前退出）/ skipped（未执行）
+        """
+        client = self.get_connection(connection_id)
+        if not client:
+            for index, command in enumerate(commands):
+                yield self._batch_result(index, command, status="skipped", stderr="连接不存在")
+            return
+        
+        marker = f"__DOCKSSH_{uuid.uuid4().hex[:12]}__"
+        script = []
+        for index, command in enumerate(commands):
+            script.append(f"eval {shlex.quote(command)} </dev/null")
+            script.append("__batch_rc=$?")
+            script.append(f"printf '\\n%sE{index}:%d\\n' '{marker}' \"$__batch_rc\"")
+            script.append(f"printf '\\n%sE{index}\\n' '{marker}' >&2")
+            if stop_on_error:
+                script.append('[ "$__batch_rc" -eq 0 ] || exit "$__batch_rc"')
+        script.append("exit 0")
+        
+        out_pattern = re.compile(b"\n" + re.escape(marker.encode()) + rb"E(\d+):(-?\d+)\n")
+        err_pattern = re.compile(b"\n" + re.escape(marker.encode()) + rb"E(\d+)\n")
+        
+        channel = None
+        results: Dict[int, dict] = {}
+        next_index = 0
+        stopped = False
+        try:
+            channel = client.get_transport().open_session(timeout=30)
+            channel.exec_command(
+                "if command -v bash >/dev/null 2>&1; then exec bash -s; else exec sh -s; fi"
+            )
+            channel.sendall(("\n".join(script) + "\n").encode())
+            channel.shutdown_write()
+            
+            out_buf, err_buf = b"", b""
+            started = time.time()
+            last_end = time.perf_counter()
+            while True:
+                readable = False
+                if channel.recv_ready():
+                    out_buf += channel.recv(65536)
+                    readable = True
+                if channel.recv_stderr_ready():
+                    err_buf += channel.recv_stderr(65536)
+                    readable = True
+                
+                # 切分已完成命令的 stdout（附带退出码和耗时）
+                while True:
+                    match = out_pattern.search(out_buf)
+                    if not match:
+                        break
+                    index = int(match.group(1))
+                    now = time.perf_counter()
+                    result = results.setdefault(index, {})
+                    result['stdout'] = out_buf[:match.start()]
+                    result['exit_code'] = int(match.group(2))
+                    result['duration'] = round(now - last_end, 3)
+                    last_end = now
+                    out_buf = out_buf[match.end():]
+                
+                # 切分已完成命令的 stderr
+                while True:
+                    match = err_pattern.search(err_buf)
+                    if not match:
+                        break
+                    results.setdefault(int(match.group(1)), {})['stderr'] = err_buf[:match.start()]
+                    err_buf = err_buf[match.end():]
+                
+                # 按顺序产出 stdout、stderr 均已结束的命令
+                while next_index in results and {'stdout', 'stderr'} <= results[next_index].keys():
+                    done = results.pop(next_index)
+                    yield self._batch_result(
+                        next_index, commands[next_index],
+                        status="ok" if done['exit_code'] == 0 else "failed",
+                        stdout=done['stdout'].decode('utf-8', errors='ignore'),
+                        stderr=done['stderr'].decode('utf-8', errors='ignore'),
+                        exit_code=done['exit_code'],
+                        duration=done['duration'],
+                    )
+                    next_index += 1
+                    stopped = stop_on_error and done['exit_code'] != 0
+                
+                if next_index >= len(commands) or stopped:
+                    break
+                if not readable:
+                    if channel.exit_status_ready() and not channel.recv_ready() \
+                            and not channel.recv_stderr_ready():
+                        break
+                    if time.time() - started > timeout:
+                        raise TimeoutError("批量执行超时")
+                    time.sleep(0.01)
+            
+            # shell 提前退出：若非因 stop_on_error 停止，则当前命令记为中断
+            if next_index < len(commands) and not stopped:
+                yield self._batch_result(
+                    next_index, commands[next_index],
+                    status="aborted",
+                    stdout=out_buf.decode('utf-8', errors='ignore'),
+                    stderr=err_buf.decode('utf-8', errors='ignore'),
+                    exit_code=channel.recv_exit_status(),
+                    duration=round(time.perf_counter() - last_end, 3),
+                )
+                next_index += 1
+        
+        except Exception as e:
+            if next_index < len(commands):
+                yield self._batch_result(next_index, commands[next_index],
+                                         status="aborted", stderr=str(e))
+                next_index += 1
+        finally:
+            if channel:
+                channel.close()
+        
+        for index in range(next_index, len(commands)):
+            yield self._batch_result(index, commands[index], status="skipped")
+    
+    @staticmethod
+    def _batch_result(index: int, command: str, status: str, stdout: str = "",
+                      stderr: str = "", exit_code: int = None, duration: float = 0.0) -> dict:
+        return {
+            'index': index,
+            'command': command,
+            'status': status,
+            'stdout': stdout,
+            'stderr': stderr,
+            'exit_code': exit_code,
+            'duration': duration,
+        }
+    
+    def measure_throughput(self, connection_id: str, size: int, workload: str = "random") -> dict:
+        """
+        测量下行吞吐：远程输出 size 字节并计时读取
+        
+        workload 见 THROUGHPUT_WORKLOADS，测试数据先在远程生成到临时文件（不计时）
+        """
+        client = self.get_connection(connection_id)
+        if not client:
+            raise ValueError("连接不存在")
+        if workload not in THROUGHPUT_WORKLOADS:
+            raise ValueError(f"未知的测试数据类型: {workload}")
+        
+        transport = client.get_transport()
+        generate = THROUGHPUT_WORKLOADS[workload].format(size=int(size))
+        stdout, stderr, exit_code = self.execute_command(
+            connection_id,
+            f"f=$(mktemp) && {generate} > \"$f\" && echo \"$f\""
+        )
+        if exit_code != 0:
+            raise RuntimeError(stderr or "生成测试数据失败")
+        path = stdout.strip()
+        command = f"cat {shlex.quote(path)}; rm -f {shlex.quote(path)}"
+        
+        channel = transport.open_session(timeout=30)
+        channel.settimeout(300)
+        start = time.perf_counter()
+        channel.exec_command(command)
+        received = 0
+        while True:
+            data = channel.recv(262144)
+            if not data:
+                break
+            received += len(data)
+        elapsed = time.perf_counter() - start
+        channel.close()
+        
+        return {
+            'bytes': received,
+            'seconds': round(elapsed, 3),
+            'mbps': round(received * 8 / elapsed / 1e6, 2) if elapsed else 0.0,
+        }
+    
+    @staticmethod
+    def _negotiated_algorithms(client) -> Optional[dict]:
+        """协商结果（加密、MAC、压缩）"""
+        transport = client.get_transport()
+        if not transport or not transport.is_active():
+            return None
+        return {
+            'cipher': transport.remote_cipher,
+            'mac': transport.remote_mac,
+            'compression': transport.remote_compression,
+        }
     
     def close_connection(self, connection_id: str):
         """关闭 SSH 连接"""
@@ -124,6 +580,8 @@ class SSHManager:
             except:
                 pass
             del self.connections[connection_id]
+            for listener in self.close_listeners:
+                listener(connection_id)
     
     def close_all(self):
         """关闭所有连接"""
@@ -141,6 +599,8 @@ class SSHManager:
                 'username': conn['username'],
                 'name': conn.get('name', f"{conn['username']}@{conn['host']}"),
                 'created_at': conn['created_at'],
+                'profile': conn.get('profile', 'default'),
+                'algorithms': self._negotiated_algorithms(conn['client']),
             }
         return None
     
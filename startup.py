@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动计时与后台预热
+记录各子系统的导入和初始化耗时，重量级模块在首页可用后于后台加载
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# 进程启动基准时间
+PROCESS_START = time.perf_counter()
+
+# 各阶段耗时（毫秒），按记录顺序
+timings: Dict[str, float] = {}
+
+# 子系统状态: pending / ready / error
+status: Dict[str, str] = {}
+
+# 子系统预热函数（普通函数在线程中执行，避免阻塞事件循环；协程函数直接等待）
+_warmups: Dict[str, Callable[[], None]] = {}
+
+_warm_task: Optional[asyncio.Task] = None
+
+
+@contextmanager
+def timed(name: str):
+    """记录代码块耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
+
+
+def register_warmup(name: str, func: Callable[[], None]):
+    """注册子系统预热函数"""
+    _warmups[name] = func
+    status.setdefault(name, "pending")
+
+
+def unregister_warmup(name: str):
+    """移除子系统预热函数（需在启动预热之前调用）"""
+    _warmups.pop(name, None)
+    status.pop(name, None)
+
+
+def _warm_ssh():
+    """预加载 paramiko（连带 cryptography）"""
+    import paramiko  # noqa: F401
+
+
+def _warm_catalog():
+    """预加载应用库所需的 httpx"""
+    import httpx  # noqa: F401
+
+
+register_warmup("ssh", _warm_ssh)
+register_warmup("catalog", _warm_catalog)
+
+
+async def _run_warmup(name: str, func: Callable[[], None]):
+    """执行单个预热函数并记录状态"""
+    start = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(func):
+            await func()
+        else:
+            await asyncio.to_thread(func)
+        status[name] = "ready"
+    except Exception as e:
+        status[name] = "error"
+        print(f"预热 {name} 失败: {e}")
+    finally:
+        timings[f"warm:{name}"] = (time.perf_counter() - start) * 1000
+
+
+async def _warm_all():
+    await asyncio.gather(*(
+        _run_warmup(name, func) for name, func in _warmups.items()
+    ))
+    timings["ready"] = (time.perf_counter() - PROCESS_START) * 1000
+
+
+def start_warm_up() -> asyncio.Task:
+    """在后台启动所有子系统预热"""
+    global _warm_task
+    if _warm_task is None:
+        _warm_task = asyncio.create_task(_warm_all())
+    return _warm_task
+
+
+async def wait_ready():
+    """等待后台预热完成"""
+    if _warm_task is not None:
+        await _warm_task
+
+
+def is_ready() -> bool:
+    """所有子系统是否已完成预热"""
+    return all(s != "pending" for s in status.values())
+
+
+def snapshot() -> dict:
+    """返回当前启动状态"""
+    return {
+        "ready": is_ready(),
+        "subsystems": dict(status),
+        "timings_ms": {k: round(v, 1) for k, v in timings.items()},
+    }
+
+
+def report() -> str:
+    """生成启动耗时报告"""
+    lines = ["⏱  启动耗时分析", "-" * 40]
+    for name, ms in timings.items():
+        lines.append(f"{name:<28}{ms:>9.1f} ms")
+    lines.append("-" * 40)
+    for name, state in status.items():
+        lines.append(f"{name:<28}{state:>12}")
+    return "\n".join(lines)
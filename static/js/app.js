@@ -9,6 +9,7 @@ let currentTemplate = null;
 let currentDockerApp = null;
 let terminal = null;
 let terminalSocket = null;
+let terminalRole = null; // 当前终端在共享会话中的角色（writer / viewer）
 let connections = [];
 let sudoPassword = ''; // 存储 sudo 密码（仅内存中）
 let isBatchMode = false; // 是否处于批量选择模式
@@ -254,9 +255,11 @@ async function loadSSHConfigs() {
 }
 
 let editingSSHConfigId = null;
+let editingSSHConfig = null; // 编辑中的完整配置（保留表单中没有的字段，如 tags）
 
 function showAddSSHModal() {
     editingSSHConfigId = null;
+    editingSSHConfig = null;
     document.getElementById('form-add-ssh').reset();
     document.querySelector('#modal-add-ssh h3').textContent = '添加 SSH 配置';
     showModal('modal-add-ssh');
@@ -268,6 +271,7 @@ async function editSSHConfig(configId) {
         const config = result.config;
         
         editingSSHConfigId = configId;
+        editingSSHConfig = config;
         
         // 填充表单（使用表单内部选择器）
         const form = document.getElementById('form-add-ssh');
@@ -276,6 +280,8 @@ async function editSSHConfig(configId) {
         form.querySelector('[name="port"]').value = config.port;
         form.querySelector('[name="username"]').value = config.username;
         form.querySelector('[name="auth_type"]').value = config.auth_type;
+        form.querySelector('[name="profile"]').value = config.profile || '';
+        form.querySelector('[name="prewarm"]').checked = !!config.prewarm;
         
         toggleAuthType(config.auth_type);
         
@@ -310,8 +316,9 @@ document.getElementById('form-add-ssh').addEventListener('submit', async (e) =>
     e.preventDefault();
     
     const formData = new FormData(e.target);
-    const data = Object.fromEntries(formData);
+    const data = {...(editingSSHConfig || {}), ...Object.fromEntries(formData)};
     data.port = parseInt(data.port);
+    data.prewarm = e.target.querySelector('[name="prewarm"]').checked;
     
     try {
         if (editingSSHConfigId) {
@@ -327,6 +334,7 @@ document.getElementById('form-add-ssh').addEventListener('submit', async (e) =>
         closeModal('modal-add-ssh');
         loadSSHConfigs();
         editingSSHConfigId = null;
+        editingSSHConfig = null;
     } catch (error) {
         showToast(`保存失败: ${error.message}`, 'error');
     }
@@ -957,6 +965,29 @@ function generateBatchInstallForm(commonParams, uniqueParams) {
     varsForm.innerHTML = formHTML;
 }
 
+// 安装脚本前插入的 docker 函数：劫持 docker pull，镜像已预拉取或本地已存在时跳过，否则优先使用加速源
+// （sudo 会清除导出的 bash 函数，因此写入每个安装脚本，而不是在外层 export）
+const DOCKER_PULL_WRAPPER = `docker() {
+    if [ "$1" = "pull" ]; then
+        local image="$2"
+        if command docker image inspect "$image" >/dev/null 2>&1; then
+            echo "   ✓ 镜像已存在: $image"
+            return 0
+        fi
+        echo "   🚀 使用加速源: $image"
+        if command docker pull "docker.1ms.run/$image" 2>/dev/null; then
+            command docker tag "docker.1ms.run/$image" "$image"
+            command docker rmi "docker.1ms.run/$image" >/dev/null 2>&1 || true
+        else
+            echo "   ⚠️ 加速源失败，使用官方源..."
+            command docker pull "$image"
+        fi
+    else
+        command docker "$@"
+    fi
+}
+export -f docker`;
+
 // 执行批量安装
 async function executeBatchInstall() {
     const connectionId = document.getElementById('batch-connection-select').value;
@@ -985,9 +1016,14 @@ async function executeBatchInstall() {
     floatingSelect.value = currentSelectedConfigId;
     if (!terminalSocket || terminalSocket.readyState !== WebSocket.OPEN) {
         await autoConnectTerminal();
-        await new Promise(resolve => setTimeout(resolve, 1500));
     }
     
+    // 先并发预拉取所有应用需要的镜像，再执行安装脚本
+    await prepullImages(selectedApps);
+    
+    // 预下载脚本需要的文件并开启制品缓存转发，安装脚本优先从本地缓存获取
+    const artifactsUrl = await prepareArtifacts(selectedApps, currentConnectionId);
+    
     // 生成批量安装脚本（所有命令合并）
     const batchCommands = [];
     
@@ -1028,23 +1064,8 @@ rm -f /tmp/install_${app.id}.sh
     const allCommands = `cat > ${finalScript} << 'FINAL_EOF'
 #!/bin/bash
 
-# 定义 docker 函数来劫持 docker pull 命令（自动使用加速源）
-docker() {
-    if [ "$1" = "pull" ]; then
-        local image="$2"
-        echo "   🚀 使用加速源: $image"
-        if command docker pull docker.1ms.run/$image 2>/dev/null; then
-            command docker tag docker.1ms.run/$image $image
-            command docker rmi docker.1ms.run/$image 2>/dev/null || true
-        else
-            echo "   加速源失败，使用官方源..."
-            command docker pull $image
-        fi
-    else
-        command docker "$@"
-    fi
-}
-export -f docker
+# 制品缓存地址（通过 SSH 反向端口转发提供，为空时脚本直接从原地址下载）
+DOCKSSH_ARTIFACTS="${artifactsUrl}"
 
 SUCCESS_COUNT=0
 FAILED_COUNT=0
@@ -1067,11 +1088,12 @@ ${selectedApps.map((app, i) => {
 echo ""
 echo "📦 [${i + 1}/${selectedApps.length}] 正在安装 ${app.name}..."
 if cat > /tmp/install_${app.id}.sh << 'APP_EOF'
+${DOCKER_PULL_WRAPPER}
 ${app.script_content || ''}
 APP_EOF
 then
     chmod +x /tmp/install_${app.id}.sh
-    if sudo bash /tmp/install_${app.id}.sh ${varValues.join(' ')}; then
+    if sudo env DOCKSSH_ARTIFACTS="\$DOCKSSH_ARTIFACTS" bash /tmp/install_${app.id}.sh ${varValues.join(' ')}; then
         SUCCESS_COUNT=\$((SUCCESS_COUNT + 1))
         echo "   ✅ ${app.name} 安装成功"
     else
@@ -1099,16 +1121,91 @@ chmod +x ${finalScript}
 sudo bash ${finalScript}
 rm -f ${finalScript}`;
     
-    // 发送到终端
-    if (terminalSocket && terminalSocket.readyState === WebSocket.OPEN) {
+    // 发送到终端（只读的共享终端不会执行输入，需先取得可写入的 shell）
+    if (await ensureTerminalWriter()) {
         terminalSocket.send(allCommands + '\n');
         showToast(`🚀 开始批量安装 ${selectedApps.length} 个应用...`, 'success');
+    } else {
+        showToast('终端不可写入，批量安装未执行', 'error');
     }
     
     // 退出批量模式
     cancelBatchMode();
 }
 
+// 预拉取镜像（跳过主机已有镜像，并发拉取，进度输出到悬浮终端）
+async function prepullImages(apps) {
+    const images = [...new Set(apps.flatMap(app => app.images || []))];
+    if (images.length === 0 || !currentConnectionId) {
+        return;
+    }
+    
+    const write = (text) => floatingTerminal && floatingTerminal.writeln(text);
+    write(`\r\n📥 预拉取 ${images.length} 个镜像...`);
+    
+    try {
+        const response = await fetch(API_BASE + '/api/docker/prepull', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                connection_id: currentConnectionId,
+                images,
+                concurrency: 3,
+                mirror: 'docker.1ms.run'
+            })
+        });
+        if (!response.ok) {
+            throw new Error('请求失败');
+        }
+        
+        // 逐行解析 NDJSON 进度事件
+        await readNdjson(response, (event) => {
+            if (event.type === 'plan') {
+                write(`   已存在 ${event.present.length} 个，需拉取 ${event.missing.length} 个`);
+            } else if (event.type === 'start') {
+                write(`   ⏳ ${event.image}`);
+            } else if (event.type === 'done') {
+                write(`   ${event.success ? '✅' : '❌'} ${event.image} (${event.duration}s)`);
+            } else if (event.type === 'error') {
+                write(`   ⚠️ ${event.message}`);
+            } else if (event.type === 'summary') {
+                write(`📥 预拉取完成: 成功 ${event.pulled}，失败 ${event.failed.length}，跳过 ${event.skipped} (${event.duration}s)\r\n`);
+            }
+        });
+    } catch (error) {
+        // 预拉取失败不影响安装，脚本会自行拉取镜像
+        write(`⚠️ 预拉取失败: ${error.message}，将由安装脚本拉取\r\n`);
+    }
+}
+
+// 预下载应用声明的文件到制品缓存并开启转发，返回远程可访问的缓存地址（失败时为空）
+async function prepareArtifacts(apps, connectionId) {
+    const urls = [...new Set(apps.flatMap(app => app.artifacts || []))];
+    if (urls.length === 0 || !connectionId) {
+        return '';
+    }
+    
+    const write = (text) => floatingTerminal && floatingTerminal.writeln(text);
+    try {
+        write(`\r\n📦 缓存 ${urls.length} 个安装文件...`);
+        const prefetch = await apiCall('/api/artifacts/prefetch', 'POST', {urls});
+        for (const result of prefetch.results) {
+            write(result.error
+                ? `   ⚠️ ${result.url}: ${result.error}`
+                : `   ✅ ${result.name} (${result.downloaded ? '已下载' : '已缓存'})`);
+        }
+        
+        // 由远程分配端口，避免同一主机上的多个连接争用固定端口；地址通过 DOCKSSH_ARTIFACTS 传给脚本
+        const forward = await apiCall(`/api/artifacts/forward/${connectionId}?port=0`, 'POST');
+        write(`📦 制品缓存已转发到远程 ${forward.url}\r\n`);
+        return forward.url;
+    } catch (error) {
+        // 失败时脚本直接从原地址下载
+        write(`⚠️ 制品缓存不可用: ${error.message}，将从原地址下载\r\n`);
+        return '';
+    }
+}
+
 function installDockerApp(app) {
     console.log('安装 Docker 应用:', app);
     currentDockerApp = app;
@@ -1141,6 +1238,11 @@ async function executeDockerApp() {
         varValues.push(value);
     });
     
+    // 预下载脚本需要的文件并开启制品缓存转发
+    const artifactsUrl = currentDockerApp.script_content
+        ? await prepareArtifacts([currentDockerApp], connectionId)
+        : '';
+    
     // 生成命令
     let command;
     if (currentDockerApp.script_content) {
@@ -1155,26 +1257,8 @@ DOCKSSH_EOF
 chmod +x ${scriptName}
 cat > /tmp/docker_wrapper.sh << 'WRAPPER_EOF'
 #!/bin/bash
-docker() {
-    if [ "$1" = "pull" ]; then
-        local image="$2"
-        echo ""
-        echo "   🚀 镜像加速拉取: $image"
-        echo "   → 尝试加速源: docker.1ms.run/$image"
-        if command docker pull docker.1ms.run/$image 2>&1 | grep -E "(Pulling|Download|already exists|Status)"; then
-            command docker tag docker.1ms.run/$image $image 2>/dev/null
-            command docker rmi docker.1ms.run/$image 2>/dev/null || true
-            echo "   ✓ 加速源下载成功，已标记为 $image"
-        else
-            echo "   ⚠️ 加速源失败，使用官方源..."
-            command docker pull $image
-        fi
-        echo ""
-    else
-        command docker "$@"
-    fi
-}
-export -f docker
+${DOCKER_PULL_WRAPPER}
+export DOCKSSH_ARTIFACTS="${artifactsUrl}"
 source ${scriptName} ${varValues.join(' ')}
 WRAPPER_EOF
 chmod +x /tmp/docker_wrapper.sh
@@ -1201,101 +1285,115 @@ rm -f ${scriptName} /tmp/docker_wrapper.sh`;
     
     // 等待终端初始化
     setTimeout(async () => {
+        // 旧式多行命令在同一个远程 shell 中批量执行，逐条显示结果
+        if (!currentDockerApp.script_content && command.trim().includes('\n')) {
+            await executeCommandsInTerminal(command, connectionId);
+            return;
+        }
+        
         // 设置连接
         document.getElementById('floating-connection-select').value = connectionId;
         
-        // 如果终端未连接，先连接
+        // 如果终端未连接，先连接（等待终端连接成功）
         if (!terminalSocket || terminalSocket.readyState !== WebSocket.OPEN) {
             await autoConnectTerminal();
-            
-            // 等待终端连接成功后直接执行整个命令
-            setTimeout(() => {
-                if (terminalSocket && terminalSocket.readyState === WebSocket.OPEN) {
-                    // 直接发送整个命令，不要逐行执行
-                    terminalSocket.send(command + '\n');
-                    showToast('正在安装，请查看终端输出...', 'success');
-                }
-            }, 1000);
-        } else {
-            // 终端已连接，直接发送整个命令
+        }
+        
+        // 直接发送整个命令，不要逐行执行；只读的共享终端需先取得可写入的 shell
+        if (await ensureTerminalWriter()) {
             terminalSocket.send(command + '\n');
             showToast('正在安装，请查看终端输出...', 'success');
+        } else {
+            showToast('终端不可写入，安装未执行', 'error');
         }
     }, 500);
 }
 
-// 在终端中逐行执行命令（支持多行脚本）
-function executeCommandsInTerminal(commandText) {
-    if (!terminalSocket || terminalSocket.readyState !== WebSocket.OPEN) {
-        showToast('终端未连接', 'error');
+// 在同一个远程 shell 中依次执行多行命令（通过 execute-batch 流式返回），逐条在终端显示结果
+async function executeCommandsInTerminal(commandText, connectionId = currentConnectionId) {
+    if (!connectionId) {
+        showToast('请先连接一个 SSH 服务器', 'error');
         return;
     }
     
-    // 按行拆分命令
-    const lines = commandText.split('\n').map(line => line.trim()).filter(line => {
-        // 过滤掉空行和注释行
+    // 按行拆分命令，过滤掉空行和注释行
+    const commands = commandText.split('\n').map(line => line.trim()).filter(line => {
         return line && !line.startsWith('#');
     });
     
-    if (lines.length === 0) {
+    if (commands.length === 0) {
         showToast('没有可执行的命令', 'warning');
         return;
     }
     
-    if (lines.length === 1) {
-        // 单行命令，直接执行
-        terminalSocket.send(lines[0] + '\n');
-        showToast('命令已发送 🚀', 'success');
-    } else {
-        // 多行命令，逐行执行
-        showToast(`正在执行 ${lines.length} 条命令...`, 'success');
-        executeCommandSequence(lines, 0);
-    }
-}
-
-// 顺序执行命令序列
-function executeCommandSequence(commands, index) {
-    if (index >= commands.length) {
-        showToast('✅ 所有命令执行完成', 'success');
-        return;
-    }
+    const currentTerminal = floatingTerminal || terminal;
+    const write = (text) => currentTerminal && currentTerminal.write(text.replace(/\r?\n/g, '\r\n'));
+    write(`\n\x1b[36m=== 开始执行 ${commands.length} 条命令 ===\x1b[0m\n`);
+    showToast(`正在执行 ${commands.length} 条命令...`, 'success');
     
-    if (!terminalSocket || terminalSocket.readyState !== WebSocket.OPEN) {
-        showToast('终端连接已断开', 'error');
+    const icons = {ok: '✅', failed: '❌', aborted: '⚠️', skipped: '⏭'};
+    const counts = {ok: 0, failed: 0, aborted: 0, skipped: 0};
+    try {
+        const response = await fetch(API_BASE + '/api/ssh/execute-batch', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                connection_id: connectionId,
+                commands,
+                stop_on_error: true,
+                stream: true
+            })
+        });
+        if (!response.ok) {
+            throw new Error('请求失败');
+        }
+        
+        await readNdjson(response, (result) => {
+            counts[result.status] += 1;
+            if (result.status === 'skipped') {
+                write(`\x1b[90m[${result.index + 1}/${commands.length}] ${result.command}（未执行）\x1b[0m\n`);
+                return;
+            }
+            write(`\x1b[33m[${result.index + 1}/${commands.length}]\x1b[0m ${result.command}\n`);
+            if (result.stdout) {
+                write(result.stdout.endsWith('\n') ? result.stdout : result.stdout + '\n');
+            }
+            if (result.stderr) {
+                write(`\x1b[31m${result.stderr.replace(/\n$/, '')}\x1b[0m\n`);
+            }
+            write(`   ${icons[result.status]} 退出码 ${result.exit_code === null ? '-' : result.exit_code} (${result.duration}s)\n`);
+        });
+    } catch (error) {
+        write(`\x1b[31m执行失败: ${error.message}\x1b[0m\n`);
+        showToast(`执行失败: ${error.message}`, 'error');
         return;
     }
     
-    const command = commands[index];
-    
-    // 在终端显示当前执行的是第几条命令
-    const currentTerminal = floatingTerminal || terminal;
-    if (index === 0 && currentTerminal) {
-        currentTerminal.writeln(`\r\n\x1b[36m=== 开始执行安装脚本 (${commands.length} 条命令) ===\x1b[0m\r\n`);
-    }
-    
-    if (currentTerminal) {
-        currentTerminal.writeln(`\x1b[33m[${index + 1}/${commands.length}]\x1b[0m ${command}`);
+    write(`\x1b[36m=== 执行完成: 成功 ${counts.ok}，失败 ${counts.failed + counts.aborted}，未执行 ${counts.skipped} ===\x1b[0m\n`);
+    if (counts.ok === commands.length) {
+        showToast('✅ 所有命令执行完成', 'success');
+    } else {
+        showToast('❌ 部分命令执行失败，请查看终端输出', 'error');
     }
-    
-    // 发送命令
-    terminalSocket.send(command + '\n');
-    
-    // 等待一段时间后执行下一条（给命令执行留时间）
-    // 对于耗时操作（如 docker pull），可能需要更长时间
-    let delay = 2000; // 默认 2 秒
-    
-    // 根据命令类型调整延迟
-    if (command.includes('docker pull') || command.includes('docker build')) {
-        delay = 5000; // pull/build 需要更长时间
-    } else if (command.includes('apt') || command.includes('yum')) {
-        delay = 3000; // 包管理命令需要更多时间
-    } else if (command.includes('mkdir') || command.includes('chmod') || command.includes('cd')) {
-        delay = 500; // 文件系统操作很快
+}
+
+// 逐行解析 NDJSON 响应，每个对象回调一次
+async function readNdjson(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const {done, value} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (line) {
+                onEvent(JSON.parse(line));
+            }
+        }
     }
-    
-    setTimeout(() => {
-        executeCommandSequence(commands, index + 1);
-    }, delay);
 }
 
 // ===== 终端管理 =====
@@ -1358,7 +1456,9 @@ async function connectTerminal() {
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
     const wsUrl = `${protocol}//${window.location.host}/ws/terminal/${connectionId}`;
     
-    terminalSocket = new WebSocket(wsUrl);
+    const socket = new WebSocket(wsUrl);
+    terminalSocket = socket;
+    terminalRole = null;
     
     terminalSocket.onopen = () => {
         showToast('终端已连接', 'success');
@@ -1366,9 +1466,13 @@ async function connectTerminal() {
     
     terminalSocket.onmessage = (event) => {
         const message = JSON.parse(event.data);
+        updateTerminalRole(socket, message);
         
         if (message.type === 'output' || message.type === 'connected') {
             terminal.write(message.data);
+            writeTerminalRole(terminal, message);
+        } else if (message.type === 'role' || message.type === 'readonly') {
+            writeTerminalRole(terminal, message);
         } else if (message.type === 'error') {
             terminal.writeln(`\r\n错误: ${message.data}\r\n`);
         }
@@ -1392,6 +1496,29 @@ async function connectTerminal() {
     });
 }
 
+// 记录当前终端的角色（忽略已被替换的旧连接的消息）
+function updateTerminalRole(socket, message) {
+    if (socket !== terminalSocket) return;
+    if (message.type === 'connected') {
+        terminalRole = message.role;
+    } else if (message.type === 'role') {
+        terminalRole = message.data;
+    }
+}
+
+// 提示共享终端中的角色（同一连接的终端默认共享一个 shell）
+function writeTerminalRole(term, message) {
+    if (message.type === 'role' && message.data === 'writer') {
+        term.writeln('\r\n\x1b[32m[已成为写入者，可以输入命令]\x1b[0m');
+    } else if (message.type === 'readonly') {
+        term.writeln(`\r\n\x1b[33m[${message.data}]\x1b[0m`);
+    } else if (message.type === 'connected' && message.shared) {
+        term.writeln(message.role === 'writer'
+            ? '\x1b[33m[已加入共享终端]\x1b[0m'
+            : '\x1b[33m[已加入共享终端，当前只读，写入者离开后自动接管]\x1b[0m');
+    }
+}
+
 function disconnectTerminal() {
     if (terminalSocket) {
         terminalSocket.close();
@@ -1716,8 +1843,9 @@ async function autoConnectTerminal() {
     }
 }
 
-// 连接已有的SSH到终端
-async function connectExistingSSHToTerminal(connectionId, configId = null) {
+// 连接已有的SSH到终端（newShell 为 true 时打开独立的 shell，不加入共享终端）
+// 返回在会话中的角色，连接失败时为 null
+async function connectExistingSSHToTerminal(connectionId, configId = null, newShell = false) {
     // 关闭旧的终端WebSocket
     if (terminalSocket) {
         terminalSocket.close();
@@ -1725,11 +1853,16 @@ async function connectExistingSSHToTerminal(connectionId, configId = null) {
     
     // 建立 WebSocket 连接
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${protocol}//${window.location.host}/ws/terminal/${connectionId}`;
+    const wsUrl = `${protocol}//${window.location.host}/ws/terminal/${connectionId}${newShell ? '?new=1' : ''}`;
     
-    terminalSocket = new WebSocket(wsUrl);
+    const socket = new WebSocket(wsUrl);
+    terminalSocket = socket;
+    terminalRole = null;
     terminal = floatingTerminal; // 使用悬浮终端
     
+    let resolveRole;
+    const connected = new Promise(resolve => { resolveRole = resolve; });
+    
     terminalSocket.onopen = () => {
         showToast('终端已连接 ✓', 'success');
         
@@ -1746,9 +1879,16 @@ async function connectExistingSSHToTerminal(connectionId, configId = null) {
     
     terminalSocket.onmessage = (event) => {
         const message = JSON.parse(event.data);
+        updateTerminalRole(socket, message);
         
         if (message.type === 'output' || message.type === 'connected') {
             floatingTerminal.write(message.data);
+            writeTerminalRole(floatingTerminal, message);
+            if (message.type === 'connected') {
+                resolveRole(message.role);
+            }
+        } else if (message.type === 'role' || message.type === 'readonly') {
+            writeTerminalRole(floatingTerminal, message);
         } else if (message.type === 'error') {
             floatingTerminal.writeln(`\r\n错误: ${message.data}\r\n`);
         }
@@ -1759,6 +1899,7 @@ async function connectExistingSSHToTerminal(connectionId, configId = null) {
     };
     
     terminalSocket.onclose = () => {
+        resolveRole(null);
         floatingTerminal.writeln('\r\n\r\n终端连接已断开\r\n');
         showToast('终端已断开', 'warning');
         
@@ -1769,6 +1910,20 @@ async function connectExistingSSHToTerminal(connectionId, configId = null) {
             selectedOption.text = selectedOption.text.replace('✓ ', '');
         }
     };
+    
+    return connected;
+}
+
+// 确保悬浮终端可以写入：共享终端由其他会话写入时，为本次执行单独打开一个 shell
+async function ensureTerminalWriter() {
+    if (terminalSocket && terminalSocket.readyState === WebSocket.OPEN && terminalRole === 'writer') {
+        return true;
+    }
+    if (!currentConnectionId) {
+        return false;
+    }
+    const role = await connectExistingSSHToTerminal(currentConnectionId, currentSelectedConfigId, true);
+    return role === 'writer';
 }
 
 function makeDraggable() {
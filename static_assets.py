@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态资源处理
+生成带内容哈希的文件名及 gzip/brotli 预压缩版本，按 Accept-Encoding 协商返回
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+STATIC_DIR = Path("static")
+BUILD_DIR = STATIC_DIR / "_build"
+MANIFEST_FILE = BUILD_DIR / "manifest.json"
+INDEX_FILE = STATIC_DIR / "index.html"
+
+# 指纹文件在 /static 下的路径前缀
+BUILD_PREFIX = "_build/"
+
+# 需要预压缩的文件类型
+COMPRESSIBLE_SUFFIXES = {".js", ".css", ".html", ".svg", ".json", ".map", ".txt"}
+
+# 预压缩文件扩展名，按优先级排列
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+
+# 原始路径 -> 指纹路径（均相对于 static 目录）
+manifest: Dict[str, str] = {}
+
+# 渲染后的首页缓存（整体替换而非原地修改，避免与后台构建线程竞争）
+_index_cache: Optional[Dict[str, object]] = None
+
+# 各编码版本 ETag 的后缀（Vary: Accept-Encoding 下每种表示需要不同的 ETag）
+ETAG_SUFFIXES = {"identity": "", "br": "-br", "gzip": "-gz"}
+
+
+def _compress_variants(data: bytes) -> Dict[str, bytes]:
+    """生成压缩版本（只保留比原文件更小的结果）"""
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+        variants["br"] = brotli.compress(data, quality=11)
+    except ImportError:
+        pass
+    return {enc: body for enc, body in variants.items() if len(body) < len(data)}
+
+
+def _write_variants(target: Path, data: bytes):
+    """写入原文件及其预压缩版本"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(data)
+    if target.suffix in COMPRESSIBLE_SUFFIXES:
+        for encoding, body in _compress_variants(data).items():
+            target.with_name(target.name + ENCODING_SUFFIXES[encoding]).write_bytes(body)
+
+
+def build_assets() -> Dict[str, str]:
+    """
+    为 static 下的资源生成指纹文件和预压缩版本
+
+    内容未变化的文件不会重复压缩，不再被引用的旧文件会被清理。
+    返回: 原始路径到指纹路径的映射
+    """
+    global manifest, _index_cache
+
+    new_manifest = {}
+    for path in sorted(STATIC_DIR.rglob("*")):
+        if not path.is_file() or BUILD_DIR in path.parents or path == INDEX_FILE:
+            continue
+
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        rel = path.relative_to(STATIC_DIR)
+        hashed = rel.with_name(f"{rel.stem}.{digest}{rel.suffix}").as_posix()
+
+        target = BUILD_DIR / hashed
+        if not target.exists():
+            _write_variants(target, data)
+        new_manifest[rel.as_posix()] = BUILD_PREFIX + hashed
+
+    # 清理过期的指纹文件
+    keep = {STATIC_DIR / p for p in new_manifest.values()}
+    for path in BUILD_DIR.rglob("*"):
+        if path.is_file() and path != MANIFEST_FILE:
+            original = path.with_suffix("") if path.suffix in (".br", ".gz") else path
+            if original not in keep:
+                path.unlink()
+
+    BUILD_DIR.mkdir(parents=True, exist_ok=True)
+    with open(MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(new_manifest, f, ensure_ascii=False, indent=2)
+
+    manifest = new_manifest
+    _index_cache = None
+    return new_manifest
+
+
+def negotiate_encoding(accept_encoding: str) -> List[str]:
+    """解析 Accept-Encoding，返回客户端可接受的预压缩编码（按优先级）"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name] = q
+
+    wildcard = accepted.get("*", 0.0)
+    return [
+        enc for enc in ENCODING_SUFFIXES
+        if accepted.get(enc, wildcard) > 0
+    ]
+
+
+def rewrite_references(html: str) -> str:
+    """将 HTML 中的静态资源引用替换为指纹路径"""
+    for original, hashed in manifest.items():
+        html = html.replace(f'"/static/{original}"', f'"/static/{hashed}"')
+    return html
+
+
+def _render_index() -> Dict[str, object]:
+    """渲染首页并生成各编码版本，按文件修改时间和清单缓存"""
+    global _index_cache
+    mtime = INDEX_FILE.stat().st_mtime_ns
+    index = _index_cache
+    if index is not None and index["mtime"] == mtime:
+        return index
+
+    body = rewrite_references(INDEX_FILE.read_text(encoding="utf-8")).encode("utf-8")
+    bodies = {"identity": body}
+    bodies.update(_compress_variants(body))
+
+    index = {
+        "mtime": mtime,
+        "etag": hashlib.sha256(body).hexdigest()[:16],
+        "bodies": bodies,
+    }
+    _index_cache = index
+    return index
+
+
+def index_response(request: Request) -> Response:
+    """返回首页（内存缓存 + ETag 协商）"""
+    index = _render_index()
+    bodies = index["bodies"]
+    encoding = next(
+        (enc for enc in negotiate_encoding(request.headers.get("accept-encoding", ""))
+         if enc in bodies),
+        "identity"
+    )
+    etag = '"%s%s"' % (index["etag"], ETAG_SUFFIXES[encoding])
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_REVALIDATE,
+        "Vary": "Accept-Encoding",
+    }
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(bodies[encoding], media_type="text/html", headers=headers)
+
+
+class AssetFiles(StaticFiles):
+    """
+    静态文件服务
+    指纹文件返回预压缩版本并长期缓存，其他文件每次协商缓存
+    """
+
+    def _precompressed(self, path: str, scope) -> Optional[Response]:
+        """查找客户端可接受的预压缩文件"""
+        if path not in manifest.values():
+            return None
+
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        for encoding in negotiate_encoding(accept):
+            full_path = STATIC_DIR / (path + ENCODING_SUFFIXES[encoding])
+            if full_path.is_file():
+                return FileResponse(
+                    full_path,
+                    media_type=media_type,
+                    headers={
+                        "Content-Encoding": encoding,
+                        "Cache-Control": CACHE_IMMUTABLE,
+                        "Vary": "Accept-Encoding",
+                    },
+                )
+        return None
+
+    async def get_response(self, path: str, scope) -> Response:
+        path = Path(path).as_posix()
+        immutable = path.startswith(BUILD_PREFIX)
+
+        if immutable:
+            response = self._precompressed(path, scope)
+            if response is not None:
+                return response
+
+        response = await super().get_response(path, scope)
+        if immutable and response.status_code == 200:
+            response.headers["Cache-Control"] = CACHE_IMMUTABLE
+            response.headers["Vary"] = "Accept-Encoding"
+        else:
+            response.headers.setdefault("Cache-Control", CACHE_REVALIDATE)
+        return response
+
+
+if __name__ == "__main__":
+    # 构建阶段预先生成指纹和压缩文件: python static_assets.py
+    result = build_assets()
+    print(f"✓ 已生成 {len(result)} 个静态资源")
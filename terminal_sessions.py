@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享终端会话
+一个 shell 通道的输出只读取一次，广播给所有订阅的 WebSocket；
+只有写入者的输入会发送到 shell，跟不上的观看者跳过积压内容或被断开
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket
+
+# 每个订阅者最多积压的消息数
+QUEUE_SIZE = 256
+
+# 观看者累计跳过次数达到该值后断开
+MAX_SKIPS = 5
+
+# 保留的最近输出（字符数），新加入的订阅者先收到这部分内容
+SCROLLBACK_SIZE = 64 * 1024
+
+# 观看者输入被拒绝时的提示间隔（秒），避免逐键提示
+READONLY_NOTICE_INTERVAL = 1.0
+
+# 跳过积压内容时发送的提示（预先编码，所有订阅者共用）
+SKIPPED_MESSAGE = json.dumps({
+    "type": "output",
+    "data": "\r\n\x1b[33m[输出过快，已跳过部分内容]\x1b[0m\r\n"
+}, ensure_ascii=False)
+
+
+class Subscriber:
+    """会话订阅者"""
+
+    def __init__(self, websocket: WebSocket, wants_write: bool):
+        self.websocket = websocket
+        self.wants_write = wants_write
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.skips = 0
+        self.dropped = False
+        self.rejected_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        """将队列中的消息依次发送给客户端"""
+        try:
+            while True:
+                text = await self.queue.get()
+                if text is None:
+                    break
+                await self.websocket.send_text(text)
+        except Exception:
+            pass
+
+
+class TerminalSession:
+    """共享终端会话"""
+
+    def __init__(self, connection_id: str, channel):
+        self.session_id = uuid.uuid4().hex[:12]
+        self.connection_id = connection_id
+        self.channel = channel
+        self.created_at = time.time()
+        self.subscribers: List[Subscriber] = []
+        self.writer: Optional[Subscriber] = None
+        self.reader_task: Optional[asyncio.Task] = None
+        self.scrollback: deque = deque()
+        self.scrollback_size = 0
+
+    def start(self):
+        self.reader_task = asyncio.create_task(self._read_from_ssh())
+
+    def subscribe(self, websocket: WebSocket, wants_write: bool = True) -> Subscriber:
+        """
+        加入会话，写入者空缺且需要写入时成为写入者
+
+        先投递 connected 消息和最近输出，之后才是实时输出
+        """
+        subscriber = Subscriber(websocket, wants_write)
+        self.subscribers.append(subscriber)
+        if self.writer is None and wants_write:
+            self.writer = subscriber
+
+        subscriber.queue.put_nowait(json.dumps({
+            "type": "connected",
+            "data": "终端已连接\r\n",
+            "session_id": self.session_id,
+            "role": self.role(subscriber),
+            "shared": len(self.subscribers) > 1
+        }, ensure_ascii=False))
+        if self.scrollback:
+            subscriber.queue.put_nowait(json.dumps({
+                "type": "output",
+                "data": "".join(self.scrollback)
+            }, ensure_ascii=False))
+        subscriber.task = asyncio.create_task(subscriber.run())
+        return subscriber
+
+    def role(self, subscriber: Subscriber) -> str:
+        return "writer" if subscriber is self.writer else "viewer"
+
+    async def unsubscribe(self, subscriber: Subscriber):
+        """离开会话；写入者离开时由最早加入且需要写入的订阅者接替"""
+        if subscriber not in self.subscribers:
+            return
+        self.subscribers.remove(subscriber)
+        if subscriber.task:
+            subscriber.task.cancel()
+
+        if subscriber is self.writer:
+            self.writer = next((s for s in self.subscribers if s.wants_write), None)
+            if self.writer:
+                self._send(self.writer, json.dumps({"type": "role", "data": "writer"}))
+
+        if not self.subscribers:
+            self.close()
+
+    def write(self, subscriber: Subscriber, data: str) -> bool:
+        """写入者的输入发送到 shell，其他订阅者的输入被拒绝并收到 readonly 消息"""
+        if subscriber is not self.writer:
+            now = time.monotonic()
+            if now - subscriber.rejected_at >= READONLY_NOTICE_INTERVAL:
+                subscriber.rejected_at = now
+                self._send(subscriber, json.dumps({
+                    "type": "readonly",
+                    "data": "当前为只读观看者，输入未发送到终端"
+                }, ensure_ascii=False))
+            return False
+        self.channel.send(data)
+        return True
+
+    def _send(self, subscriber: Subscriber, text: str):
+        """投递消息；队列已满时跳过积压内容，观看者多次跳过后断开"""
+        try:
+            subscriber.queue.put_nowait(text)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if subscriber.dropped:
+            return
+        subscriber.skips += 1
+        if subscriber is not self.writer and subscriber.skips >= MAX_SKIPS:
+            subscriber.dropped = True
+            asyncio.create_task(self._drop(subscriber))
+            return
+
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(SKIPPED_MESSAGE)
+        subscriber.queue.put_nowait(text)
+
+    async def _drop(self, subscriber: Subscriber):
+        """断开跟不上的观看者"""
+        await self.unsubscribe(subscriber)
+        try:
+            await subscriber.websocket.close(code=1013, reason="viewer too slow")
+        except Exception:
+            pass
+
+    def _remember(self, output: str):
+        """记录最近输出，超出 SCROLLBACK_SIZE 时丢弃最早的部分"""
+        output = output[-SCROLLBACK_SIZE:]
+        self.scrollback.append(output)
+        self.scrollback_size += len(output)
+        while self.scrollback_size > SCROLLBACK_SIZE:
+            self.scrollback_size -= len(self.scrollback.popleft())
+
+    def broadcast(self, message: dict):
+        """消息只编码一次，同一个字符串投递给所有订阅者"""
+        text = json.dumps(message, ensure_ascii=False)
+        for subscriber in list(self.subscribers):
+            self._send(subscriber, text)
+
+    async def _read_from_ssh(self):
+        """从 SSH 读取数据并广播"""
+        while True:
+            try:
+                if self.channel.recv_ready():
+                    output = self.channel.recv(65536).decode('utf-8', errors='ignore')
+                    if output:
+                        self._remember(output)
+                        self.broadcast({"type": "output", "data": output})
+                    await asyncio.sleep(0)  # 让出事件循环，避免持续输出时饿死发送任务
+                    continue
+                if self.channel.exit_status_ready():
+                    self.broadcast({"type": "error", "data": "终端会话已结束"})
+                    break
+                await asyncio.sleep(0.01)  # 10ms 轮询间隔
+            except Exception as e:
+                print(f"读取 SSH 输出错误: {e}")
+                break
+
+        # shell 结束后断开所有订阅者
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(None)
+                await asyncio.wait_for(subscriber.task, timeout=1)
+            except Exception:
+                pass
+            try:
+                await subscriber.websocket.close()
+            except Exception:
+                pass
+        self.close()
+
+    def close(self):
+        """关闭会话"""
+        sessions.pop(self.session_id, None)
+        if self.reader_task and self.reader_task is not asyncio.current_task():
+            self.reader_task.cancel()
+        try:
+            self.channel.close()
+        except Exception:
+            pass
+
+    def info(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "connection_id": self.connection_id,
+            "created_at": self.created_at,
+            "subscribers": len(self.subscribers),
+            "has_writer": self.writer is not None,
+        }
+
+
+# 活动会话: session_id -> TerminalSession
+sessions: Dict[str, TerminalSession] = {}
+
+
+def create_session(connection_id: str, channel) -> TerminalSession:
+    session = TerminalSession(connection_id, channel)
+    sessions[session.session_id] = session
+    session.start()
+    return session
+
+
+def get_session(session_id: str, connection_id: str) -> Optional[TerminalSession]:
+    session = sessions.get(session_id)
+    if session and session.connection_id == connection_id:
+        return session
+    return None
+
+
+def find_session(connection_id: str) -> Optional[TerminalSession]:
+    """返回该连接最近创建的会话"""
+    matching = [s for s in sessions.values() if s.connection_id == connection_id]
+    return max(matching, key=lambda s: s.created_at, default=None)
+
+
+def list_sessions(connection_id: Optional[str] = None) -> List[dict]:
+    return [
+        s.info() for s in sessions.values()
+        if connection_id is None or s.connection_id == connection_id
+    ]
+
+
+def close_all():
+    for session in list(sessions.values()):
+        session.close()